@@ -1 +1,7 @@
-from . import *
\ No newline at end of file
+from dotenv import load_dotenv
+
+# Modules read their settings from the environment at import time (e.g. METRICS_ENABLED,
+# SUB_AGENT_POOL_SIZE, PLOT_RENDER_WORKERS), so .env is loaded before any of them.
+load_dotenv()
+
+from . import *
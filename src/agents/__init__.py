@@ -1 +1 @@
-from . import plotly_agent, letter_counter_agent
\ No newline at end of file
+from . import pool, plotly_agent, letter_counter_agent
\ No newline at end of file
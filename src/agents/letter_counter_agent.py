@@ -1,7 +1,10 @@
 from strands import Agent, tool
 from strands_tools import calculator, current_time, python_repl
 from strands.models import BedrockModel
+from .. import metrics
 from ..tools import *
+from ..tools.letter_router import route_letter_query
+from .pool import AgentPool, SUB_AGENT_POOL_SIZE
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,16 +20,39 @@ You are an agent that is highly specialized in counting letter occurrences in wo
 number of occurrences of a specific letter in a word and return only a single number, for example, if the word is "hello" and the letter is "l", you will return 2.
 """
 
+letter_counter_pool = AgentPool(
+    lambda: Agent(
+        system_prompt=RESEARCH_ASSISTANT_PROMPT,
+        model=bedrock_model,
+        tools=[calculator, current_time, python_repl, letter_counter]
+    ),
+    size=SUB_AGENT_POOL_SIZE,
+    name="count_letters",
+)
+
 @tool
+@metrics.traced_tool
 def count_letters(query: str) -> str:
+    """
+    Counts occurrences of letters in words. Accepts a natural-language question
+    (e.g. "how many r's in strawberry?") or a batch of (word, letter) pairs.
+
+    Args:
+        query (str): The letter-count request.
+
+    Returns:
+        str: The count, or one "word / letter: count" line per pair for batches.
+    """
+    # Common phrasings are answered locally; only unparsed requests reach the LLM
+    answer = route_letter_query(query)
+    metrics.count("letter_router", path="fast" if answer is not None else "llm")
+    if answer is not None:
+        return answer
     try:
-        agent = Agent(
-            system_prompt=RESEARCH_ASSISTANT_PROMPT,
-            model=bedrock_model,
-            tools=[calculator, current_time, python_repl, letter_counter]
-        )
-        
-        response = agent(query)
+        with letter_counter_pool.agent() as agent:
+            with metrics.span("sub_agent", agent="count_letters"):
+                response = agent(query)
+            metrics.record_agent_usage("count_letters", response)
         return response
     except Exception as e:
         return f"An error occurred: {e}"
\ No newline at end of file
@@ -0,0 +1,321 @@
+import ast
+import base64
+import hashlib
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+from cachetools import LRUCache
+from .plot_worker import SAFE_BUILTINS
+
+# --- Plot rendering configuration ---
+# Snippets produced by the Plotly agent are validated and executed by a pool of warm
+# worker processes (plotly imported once per worker), never in the caller's process.
+PLOT_RENDER_WORKERS = int(os.getenv("PLOT_RENDER_WORKERS", "2"))
+PLOT_RENDER_TIMEOUT_SECONDS = float(os.getenv("PLOT_RENDER_TIMEOUT_SECONDS", "20"))
+PLOT_CODE_CACHE_SIZE = int(os.getenv("PLOT_CODE_CACHE_SIZE", "256"))
+
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plot_worker.py")
+
+# Module names a snippet may call into, one level deep: `px.<function>(...)`, `go.<Class>(...)`
+_ALLOWED_MODULES = {"px", "go"}
+_FORBIDDEN_NODES = (ast.Import, ast.ImportFrom, ast.Global, ast.Nonlocal, ast.Delete,
+                    ast.With, ast.AsyncWith, ast.Try, ast.Raise, ast.While, ast.FunctionDef,
+                    ast.AsyncFunctionDef, ast.ClassDef, ast.Await, ast.Yield, ast.YieldFrom)
+_LITERAL_NODES = (ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.Set)
+_FENCED_BLOCK = re.compile(r"```[^\n`]*\n(?P<code>.*?)```", re.DOTALL)
+_FIG_ASSIGNMENT = re.compile(r"^fig\s*=", re.MULTILINE)
+
+
+class SnippetValidationError(ValueError):
+    """Raised when generated plot code is not a safe `fig = ...` snippet."""
+
+
+def _parses(code: str) -> bool:
+    try:
+        ast.parse(code, mode="exec")
+    except SyntaxError:
+        return False
+    return True
+
+
+def extract_snippet(response_text: str):
+    """
+    Extracts the `fig = ...` snippet from the Plotly agent's response.
+
+    The first fenced code block with a `fig =` line is used when there is one.
+    Otherwise the snippet runs from the `fig =` line up to the first line that is not
+    part of it, so prose after the code is left out.
+
+    Returns:
+        str | None: The snippet, or None if the agent answered "Failed" or gave no snippet.
+    """
+    text = response_text or ""
+    for fenced in _FENCED_BLOCK.finditer(text):
+        code = fenced.group("code")
+        match = _FIG_ASSIGNMENT.search(code)
+        if match:
+            return code[match.start():].strip()
+
+    match = _FIG_ASSIGNMENT.search(text)
+    if not match:
+        return None
+    lines = text[match.start():].splitlines()
+    snippet_end = 0  # Number of lines forming complete statements so far
+    for number, line in enumerate(lines):
+        if number and snippet_end == number and line.strip() and not line.startswith("fig."):
+            break  # A new line that neither continues a statement nor updates the figure: prose
+        if _parses("\n".join(lines[:number + 1])):
+            snippet_end = number + 1
+    if not snippet_end:
+        return None
+    return "\n".join(lines[:snippet_end]).strip()
+
+
+def _figure_update_attribute(statement):
+    """Returns the `fig.update_*(...)` / `fig.add_*(...)` attribute node of a statement, or None."""
+    if not isinstance(statement, ast.Expr) or not isinstance(statement.value, ast.Call):
+        return None
+    func = statement.value.func
+    if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "fig"
+            and func.attr.startswith(("update_", "add_"))):
+        return func
+    return None
+
+
+def _is_module_call(node) -> bool:
+    """True for `px.<function>(...)` / `go.<Class>(...)` calls."""
+    func = node.func
+    return (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+            and func.value.id in _ALLOWED_MODULES and not func.attr.startswith("_"))
+
+
+def validate_snippet(code: str) -> str:
+    """
+    Checks that `code` is a `fig = ...` assignment (optionally followed by `fig.update_*` /
+    `fig.add_*` calls) using only plotly (`px`, `go`), literals and a few safe builtins.
+
+    Attribute access is limited to calling `px.<function>`, `go.<Class>` and the figure
+    update methods; subscripts are only allowed on literals.
+
+    Returns:
+        str: The code, unchanged.
+
+    Raises:
+        SnippetValidationError: If the code is not acceptable.
+    """
+    try:
+        tree = ast.parse(code, mode="exec")
+    except SyntaxError as e:
+        raise SnippetValidationError(f"Snippet is not valid Python: {e}")
+    if not tree.body or not isinstance(tree.body[0], ast.Assign):
+        raise SnippetValidationError("Snippet must start with a `fig = ...` assignment.")
+    targets = tree.body[0].targets
+    if len(targets) != 1 or not isinstance(targets[0], ast.Name) or targets[0].id != "fig":
+        raise SnippetValidationError("Snippet must assign to `fig`.")
+    allowed_attributes = [_figure_update_attribute(statement) for statement in tree.body[1:]]
+    if not all(allowed_attributes):
+        raise SnippetValidationError("Only `fig.update_*` / `fig.add_*` calls may follow the assignment.")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _is_module_call(node):
+            allowed_attributes.append(node.func)
+    allowed_attribute_ids = {id(node) for node in allowed_attributes}
+    # `px` / `go` / `fig` may only appear as the root of those attributes
+    allowed_root_ids = {id(node.value) for node in allowed_attributes}
+
+    # Names bound inside the expressions (comprehension variables, lambda arguments)
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.comprehension):
+            bound.update(n.id for n in ast.walk(node.target) if isinstance(n, ast.Name))
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+
+    allowed_names = set(SAFE_BUILTINS) | (bound - _ALLOWED_MODULES - {"fig"})
+    for node in ast.walk(tree):
+        if isinstance(node, _FORBIDDEN_NODES):
+            raise SnippetValidationError(f"'{type(node).__name__}' is not allowed in plot snippets.")
+        if isinstance(node, ast.Attribute) and id(node) not in allowed_attribute_ids:
+            raise SnippetValidationError(
+                f"Attribute '{node.attr}' is not allowed; only `px.<function>(...)`, `go.<Class>(...)` "
+                "and `fig.update_*` / `fig.add_*` calls are.")
+        if isinstance(node, ast.Subscript) and not isinstance(node.value, _LITERAL_NODES):
+            raise SnippetValidationError("Subscripts are only allowed on literals.")
+        if isinstance(node, ast.Name):
+            if node is targets[0] or id(node) in allowed_root_ids:
+                continue
+            if node.id not in allowed_names:
+                raise SnippetValidationError(f"Name '{node.id}' is not allowed in plot snippets.")
+    return code
+
+
+class _RenderWorker:
+    """One warm worker subprocess running plot_worker.py."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, _WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        # Responses are read on a thread so `render` can wait with a timeout
+        self._responses = queue.Queue()
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    def _read_responses(self):
+        for line in self.process.stdout:
+            self._responses.put(line)
+        self._responses.put(None)  # Worker exited
+
+    def render(self, code: str, output_format: str, timeout: float):
+        self.process.stdin.write(json.dumps({"code": code, "format": output_format}) + "\n")
+        self.process.stdin.flush()
+        try:
+            line = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Rendering did not finish within {timeout} seconds.")
+        if line is None:
+            raise RuntimeError("Plot render worker exited unexpectedly.")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(f"Plot snippet failed: {response['error']}")
+        if output_format == "png":
+            return base64.b64decode(response["result"])
+        return response["result"]
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class PlotRenderer:
+    """
+    A pool of warm subprocess workers that execute validated `fig = ...` snippets.
+
+    Each worker has plotly preloaded and runs one snippet at a time; a snippet that
+    exceeds the timeout gets its worker killed and replaced. Nothing is pickled between
+    calls: every snippet starts from a fresh namespace.
+    """
+
+    def __init__(self, size: int = PLOT_RENDER_WORKERS, timeout: float = PLOT_RENDER_TIMEOUT_SECONDS):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = 0
+
+    def warm_up(self):
+        """Starts all workers upfront so the first render does not pay for the plotly import."""
+        with self._lock:
+            missing = self.size - self._started
+            self._started = self.size
+        for _ in range(missing):
+            self._idle.put(_RenderWorker())
+
+    def render(self, code: str, output_format: str = "json"):
+        """
+        Validates and renders a snippet.
+
+        Args:
+            code (str): A `fig = ...` snippet.
+            output_format (str): "json" for the figure JSON, or "png" for PNG bytes.
+
+        Returns:
+            str | bytes: The rendered figure.
+        """
+        validate_snippet(code)
+        worker = self._acquire()
+        try:
+            return worker.render(code, output_format, self.timeout)
+        except TimeoutError:
+            worker.stop(kill=True)  # The snippet may still be running; replace the worker
+            raise
+        finally:
+            if not worker.is_alive():
+                worker = _RenderWorker()
+            self._idle.put(worker)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_start = self._started < self.size
+            if can_start:
+                self._started += 1
+        if can_start:
+            return _RenderWorker()
+        return self._idle.get()
+
+    def close(self):
+        with self._lock:
+            self._started = 0
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+class PlotCodeCache:
+    """LRU cache of validated snippets keyed on the normalized (data, context) request."""
+
+    def __init__(self, size: int = PLOT_CODE_CACHE_SIZE):
+        self._cache = LRUCache(maxsize=size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str) -> str:
+        # Whitespace is normalized; case is kept because labels and titles are case-sensitive
+        return hashlib.sha256(" ".join(query.split()).encode("utf-8")).hexdigest()
+
+    def get(self, query: str):
+        with self._lock:
+            snippet = self._cache.get(self.key(query))
+            if snippet is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return snippet
+
+    def put(self, query: str, snippet: str):
+        with self._lock:
+            self._cache[self.key(query)] = snippet
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
+_renderer_lock = threading.Lock()
+_renderer = None
+
+
+def get_renderer() -> PlotRenderer:
+    """Returns the shared renderer, created on first use."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PlotRenderer()
+    return _renderer
@@ -0,0 +1,86 @@
+"""
+Plot render worker.
+
+Started as a standalone script by plot_renderer.PlotRenderer (so it does not import the
+agents package): imports plotly once, then reads JSON requests from stdin, one per line,
+and answers each with one JSON line on stdout:
+    request:  {"code": "fig = ...", "format": "json" | "png"}
+    response: {"ok": true, "result": "<figure JSON or base64 PNG>"} or {"ok": false, "error": "..."}
+
+On Unix the worker limits its own address space (PLOT_WORKER_MEMORY_LIMIT_MB, 0 to
+disable) and the CPU time of each snippet (PLOT_WORKER_CPU_SECONDS); a snippet that
+allocates too much fails with MemoryError, one that spins is killed by SIGXCPU and the
+renderer replaces the worker. PNG export starts kaleido's browser as a child process,
+which inherits the address space limit; raise or disable it when using PNG output.
+"""
+import base64
+import json
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PLOT_WORKER_MEMORY_LIMIT_MB = int(os.getenv("PLOT_WORKER_MEMORY_LIMIT_MB", "2048"))
+PLOT_WORKER_CPU_SECONDS = int(os.getenv("PLOT_WORKER_CPU_SECONDS", "10"))
+
+# Builtins available to snippets; plot_renderer.validate_snippet allows the same names.
+SAFE_BUILTINS = {
+    "abs": abs, "dict": dict, "enumerate": enumerate, "float": float, "int": int, "len": len,
+    "list": list, "max": max, "min": min, "range": range, "round": round, "sorted": sorted,
+    "str": str, "sum": sum, "tuple": tuple, "zip": zip, "True": True, "False": False, "None": None,
+}
+
+
+def _limit_memory():
+    """Caps the worker's address space. Called after the plotly imports, which the limit must cover."""
+    if resource is None or PLOT_WORKER_MEMORY_LIMIT_MB <= 0:
+        return
+    limit = PLOT_WORKER_MEMORY_LIMIT_MB * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu():
+    """Allows the next snippet PLOT_WORKER_CPU_SECONDS of CPU time on top of what the worker has used."""
+    if resource is None or PLOT_WORKER_CPU_SECONDS <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + PLOT_WORKER_CPU_SECONDS
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def main():
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    _limit_memory()
+    responses = sys.stdout
+    sys.stdout = sys.stderr  # Stray prints must not corrupt the protocol
+    for line in sys.stdin:
+        try:
+            _limit_cpu()
+            request = json.loads(line)
+            namespace = {"__builtins__": dict(SAFE_BUILTINS), "px": px, "go": go}
+            exec(compile(request["code"], "<plot snippet>", "exec"), namespace)
+            fig = namespace["fig"]
+            if request.get("format") == "png":
+                result = base64.b64encode(fig.to_image(format="png")).decode("ascii")  # Requires kaleido
+            else:
+                result = fig.to_json()
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
+import os
 from strands import Agent, tool
-from strands_tools import calculator, python_repl
+from strands_tools import calculator
 from strands.models import BedrockModel
+from .. import metrics
 from ..tools import *
+from .plot_renderer import PlotCodeCache, SnippetValidationError, extract_snippet, get_renderer, validate_snippet
+from .pool import AgentPool, SUB_AGENT_POOL_SIZE
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Rendered figures are written here; the tool returns the snippet and the file path.
+PLOT_OUTPUT_DIR = os.getenv("PLOT_OUTPUT_DIR", "plots")
+PLOT_OUTPUT_FORMAT = os.getenv("PLOT_OUTPUT_FORMAT", "json")  # or "png" (requires kaleido)
+
 bedrock_model2 = BedrockModel(
     model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
     region_name='us-east-1',
@@ -40,7 +48,10 @@ You will receive a query containing a brief explanation of the data, followed by
     * **Do NOT** include `print()` statements.
     * **Do NOT** include `fig.show()`.
     * The code **must always** begin with `fig = ...`
-    * You can use any valid Plotly function (e.g., `px.scatter`, `go.Figure`, `go.Bar`, etc.).
+* **Allowed Code - The snippet is validated and rejected otherwise:**
+    * Call Plotly only as `px.<function>(...)` or `go.<Class>(...)` (e.g., `px.scatter`, `px.bar`, `go.Figure`, `go.Bar`). Nothing deeper: no `px.colors...`, `px.data...` or `go.layout...`; pass colors as strings (e.g., `"#1f77b4"`) and layout options as keyword arguments or dicts (e.g., `title=dict(text="Sales")`).
+    * After the `fig = ...` line you may only add separate `fig.update_...(...)` or `fig.add_...(...)` statements. Do not chain calls (no `px.bar(...).update_layout(...)`) and do not access figure attributes (no `fig.data[0]`, no `fig.layout`).
+    * Use only literals (numbers, strings, lists, dicts, tuples), comprehensions, lambdas and the builtins `abs`, `dict`, `enumerate`, `float`, `int`, `len`, `list`, `max`, `min`, `range`, `round`, `sorted`, `str`, `sum`, `tuple`, `zip`. Indexing is only allowed on literals.
 * **Handle Insufficient Data:** If the provided data is absolutely insufficient, ambiguous, or impossible to visualize meaningfully (i.e., it violates Rule 2), return the single word: "Failed".
 
 **Output Examples (Exact Format):**
@@ -54,17 +65,88 @@ fig = px.line(x=["A", "B", "C"], y=[10, 12, 8], title="Trend Over Categories")
 fig = px.pie(names=['Apples', 'Bananas', 'Cherries'], values=[30, 45, 25], title='Fruit Distribution')
 """
 
+plot_agent_pool = AgentPool(
+    lambda: Agent(
+        system_prompt=RESEARCH_ASSISTANT_PROMPT,
+        model=bedrock_model2,
+        tools=[calculator]  # Snippets are executed by the plot renderer, not a python_repl
+    ),
+    size=SUB_AGENT_POOL_SIZE,
+    name="generate_plot",
+)
+
+plot_code_cache = PlotCodeCache()
+
+def _ask_for_snippet(agent, query: str):
+    """
+    Asks a pooled agent for a snippet. A snippet the validator rejects is sent back to
+    the same agent once, with the reason, before giving up.
+
+    Returns:
+        str | None: A validated snippet, or None if the agent answered "Failed".
+
+    Raises:
+        SnippetValidationError: If the corrected snippet is rejected as well.
+    """
+    prompt = query
+    response = None
+    try:
+        for attempt in range(2):
+            with metrics.span("sub_agent", agent="generate_plot"):
+                response = agent(prompt)
+            snippet = extract_snippet(str(response))
+            if snippet is None:
+                return None
+            try:
+                return validate_snippet(snippet)
+            except SnippetValidationError as e:
+                if attempt:
+                    raise
+                metrics.count("plot_snippet_retries")
+                prompt = (f"That code was rejected: {e} Rewrite it following the allowed code rules, "
+                          "and answer with the corrected snippet only.")
+    finally:
+        if response is not None:
+            # Usage accumulates over both attempts, so it is recorded once
+            metrics.record_agent_usage("generate_plot", response)
+
+def _save_figure(query: str, figure) -> str:
+    """Writes a rendered figure to PLOT_OUTPUT_DIR and returns its path."""
+    os.makedirs(PLOT_OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(PLOT_OUTPUT_DIR, f"{PlotCodeCache.key(query)[:16]}.{PLOT_OUTPUT_FORMAT}")
+    with open(path, "wb" if isinstance(figure, bytes) else "w") as f:
+        f.write(figure)
+    return path
+
 @tool
+@metrics.traced_tool
 def generate_plot(query: str) -> str:
+    """
+    Generates a Plotly visualization for the data and context in the query.
+
+    Args:
+        query (str): A short explanation of the data followed by the data itself.
+
+    Returns:
+        str: The `fig = ...` Plotly snippet and the path of the rendered figure,
+             or "Failed" if the data cannot be visualized.
+    """
     print(query)
     try:
-        agent = Agent(
-            system_prompt=RESEARCH_ASSISTANT_PROMPT,
-            model=bedrock_model2,
-            tools=[calculator, python_repl]
-        )
-        
-        response = agent(query)
-        return response
+        # Identical (data, context) requests reuse the snippet without calling the LLM
+        snippet = plot_code_cache.get(query)
+        metrics.count("plot_code_cache", result="hit" if snippet is not None else "miss")
+        if snippet is None:
+            with plot_agent_pool.agent() as agent:
+                snippet = _ask_for_snippet(agent, query)
+            if snippet is None:
+                return "Failed"
+
+        with metrics.span("plot_render", format=PLOT_OUTPUT_FORMAT):
+            figure = get_renderer().render(snippet, output_format=PLOT_OUTPUT_FORMAT)
+        plot_code_cache.put(query, snippet)
+        return f"{snippet}\n\nFigure saved to {_save_figure(query, figure)}"
+    except SnippetValidationError as e:
+        return f"An error occurred: the generated plot code was rejected ({e})"
     except Exception as e:
         return f"An error occurred: {e}"
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Default number of pre-built agents per sub-agent pool. Also caps how many calls to one
+# sub-agent can run concurrently; further callers wait for a free agent.
+SUB_AGENT_POOL_SIZE = int(os.getenv("SUB_AGENT_POOL_SIZE", "4"))
+
+
+class AgentPool:
+    """
+    A bounded pool of reusable sub-agents.
+
+    Agents are built by `factory` on demand, up to `size` of them, and reused afterwards:
+    the system prompt, model client and tool registry are set up only once per agent.
+    Each agent's conversation is reset before it goes back to the pool, so calls do not
+    see each other's messages.
+
+    Usage:
+        with pool.agent() as agent:
+            response = agent(query)
+    """
+
+    def __init__(self, factory, size: int = SUB_AGENT_POOL_SIZE, name: str = "agents"):
+        self.name = name
+        self.size = max(1, size)
+        self._factory = factory
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used (warm) agents busy
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._busy_time = 0.0
+        self._started_at = time.monotonic()
+
+    def warm_up(self, count: int = None):
+        """Builds agents upfront (all of them by default) so no call pays the construction cost."""
+        with self._lock:
+            missing = min(self.size, count or self.size) - self._created
+            self._created += max(0, missing)
+        for _ in range(max(0, missing)):
+            self._idle.put(self._factory())
+
+    @contextmanager
+    def agent(self, timeout: float = None):
+        """
+        Borrows an agent for the duration of the `with` block.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free agent before raising TimeoutError.
+        """
+        requested_at = time.monotonic()
+        agent = self._acquire(timeout)
+        acquired_at = time.monotonic()
+        wait = acquired_at - requested_at
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            yield agent
+        finally:
+            reusable = True
+            try:
+                self._reset(agent)
+            except Exception as e:
+                print(f"Could not reset agent from pool '{self.name}', discarding it: {e}")
+                reusable = False
+            with self._lock:
+                self._in_use -= 1
+                self._busy_time += time.monotonic() - acquired_at
+                if not reusable:
+                    self._created -= 1
+            if reusable:
+                self._idle.put(agent)
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No agent available in pool '{self.name}' after {timeout} seconds.")
+
+    @staticmethod
+    def _reset(agent):
+        """Clears the conversation state (and per-call usage metrics) so the next caller starts fresh."""
+        agent.messages = []
+        if hasattr(agent, "event_loop_metrics"):
+            agent.event_loop_metrics = type(agent.event_loop_metrics)()
+
+    def metrics(self) -> dict:
+        """Returns pool usage: wait times and utilization (busy agent-seconds / capacity)."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "name": self.name,
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "acquisitions": self._acquisitions,
+                "avg_wait_seconds": self._total_wait / self._acquisitions if self._acquisitions else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "utilization": self._busy_time / (self.size * elapsed) if elapsed > 0 else 0.0,
+            }
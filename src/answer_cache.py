@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from cachetools import TTLCache
+from . import metrics
+from .qdrant_db import cache, retrieve
+from .qdrant_db.clients import get_encoder
+from .qdrant_db.stores import get_vector_store
+
+# Semantic cache of orchestrator answers. Questions are embedded with the shared encoder
+# (through the query-embedding cache, so a cached question costs no forward pass) and a
+# new question reuses the answer of a previous one whose cosine similarity is at least
+# ANSWER_CACHE_SIMILARITY_THRESHOLD. Entries expire after ANSWER_CACHE_TTL_SECONDS, the
+# least recently used are evicted beyond ANSWER_CACHE_SIZE, and every entry is dropped
+# when the collection it was answered from changes: writes by this process are seen
+# immediately (cache.collection_version), writes by other processes such as an
+# ingestion run through the store's revision (VectorStore.revision), which is checked
+# at most every ANSWER_CACHE_REVISION_CHECK_SECONDS.
+# Opt-in, because a threshold that is too low returns answers to different questions.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+ANSWER_CACHE_REVISION_CHECK_SECONDS = float(os.getenv("ANSWER_CACHE_REVISION_CHECK_SECONDS", "5"))
+
+
+class SemanticAnswerCache:
+    """Maps questions to answers by embedding similarity. Only use it for standalone questions."""
+
+    def __init__(self, size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD, enabled: bool = ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.enabled = enabled
+        self._entries = TTLCache(maxsize=size, ttl=ttl)  # entry id -> entry dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._revision = None
+        self._revision_checked_at = None
+
+    @staticmethod
+    def _collection_name():
+        # Read at call time: retrieve.COLLECTION_NAME can be reassigned (e.g. by the benchmarks)
+        return retrieve.COLLECTION_NAME
+
+    @staticmethod
+    def _embed(question: str) -> np.ndarray:
+        encoder = get_encoder()
+        vector = np.asarray(cache.get_query_embedding(question, lambda q: encoder.encode(q).tolist()),
+                            dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _store_revision(self):
+        now = time.monotonic()
+        checked_at = self._revision_checked_at
+        if checked_at is None or now - checked_at >= ANSWER_CACHE_REVISION_CHECK_SECONDS:
+            try:
+                self._revision = get_vector_store().revision(self._collection_name())
+            except Exception as e:
+                print(f"Could not read the collection revision for the answer cache: {e}")
+                self._revision = None
+            self._revision_checked_at = now
+        return self._revision
+
+    def version(self) -> tuple:
+        """
+        Returns the current version of the collection answers are taken from. Read it
+        before computing an answer and pass it to `put`, so an answer computed while the
+        collection changed is not stamped with the new version. None when the cache is
+        disabled.
+        """
+        if not self.enabled:
+            return None
+        collection_name = self._collection_name()
+        return cache.collection_version(collection_name), self._store_revision()
+
+    def _drop_stale(self, version: tuple):
+        """Drops entries answered before the last write to the collection. Call with `_lock` held."""
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry["version"] != version]
+        for entry_id in stale:
+            self._entries.pop(entry_id, None)
+        self.invalidations += len(stale)
+
+    def get(self, question: str):
+        """
+        Returns the cached answer of the most similar previous question, or None.
+
+        Returns:
+            str | None: The answer, if a question with similarity >= threshold was answered
+                        from the current version of the collection.
+        """
+        if not self.enabled or not question.strip():
+            return None
+        vector = self._embed(question)
+        version = self.version()
+        with self._lock:
+            self._drop_stale(version)
+            entries = list(self._entries.items())
+            best_id, best_score = None, -1.0
+            if entries:
+                scores = np.stack([entry["vector"] for _, entry in entries]) @ vector
+                best = int(np.argmax(scores))
+                best_id, best_score = entries[best][0], float(scores[best])
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                metrics.count("answer_cache", result="miss")
+                return None
+            entry = self._entries[best_id]  # Refreshes its LRU position
+            self.hits += 1
+        metrics.count("answer_cache", result="hit")
+        print(f"Answer served from the semantic cache (similarity {best_score:.3f} "
+              f"to \"{entry['question']}\").")
+        return entry["answer"]
+
+    def put(self, question: str, answer: str, version: tuple = None):
+        """
+        Stores the answer to a standalone question.
+
+        Args:
+            version (tuple, optional): `version()` as read before the answer was computed.
+                                       Defaults to the current version.
+        """
+        if not self.enabled or not question.strip() or not answer:
+            return
+        vector = self._embed(question)
+        version = version if version is not None else self.version()
+        with self._lock:
+            self._entries[uuid.uuid4().hex] = {
+                "question": question,
+                "vector": vector,
+                "answer": answer,
+                "version": version,
+                "created_at": time.time(),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations, "size": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+answer_cache = SemanticAnswerCache()
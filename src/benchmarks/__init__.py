@@ -0,0 +1 @@
+from . import synthetic
\ No newline at end of file
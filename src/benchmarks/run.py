@@ -0,0 +1,197 @@
+"""
+Benchmark suite for ingestion throughput and retrieval latency.
+
+Generates a synthetic PDF corpus, ingests it with `run_pdf_processing_pipeline` into a
+local vector store (Qdrant's in-memory mode by default, no server needed), then replays
+a query set through `retrieve_relevant_texts`. Results are written as JSON so runs can
+be diffed between releases:
+
+    python -m src.benchmarks.run --pdfs 20 --pages 30 --queries 500 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import psutil
+from qdrant_client import QdrantClient
+from ..qdrant_db import cache, clients, embed, encoders, retrieve, stores
+from .synthetic import generate_pdfs, generate_queries
+
+COLLECTION_NAME = "benchmark_collection"
+
+
+class _PeakRssSampler:
+    """Samples the RSS of this process and its children (e.g. extraction workers) in the background."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass  # Child exited between listing and sampling
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+@contextmanager
+def _stage(results: dict, name: str):
+    """Times a stage and records its wall time and peak RSS under `results[name]`."""
+    stage = results.setdefault(name, {})
+    with _PeakRssSampler() as sampler:
+        start = time.perf_counter()
+        yield stage
+        stage["seconds"] = time.perf_counter() - start
+    stage["peak_rss_mb"] = sampler.peak / (1024 * 1024)
+
+
+def _latency_summary(latencies) -> dict:
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+    }
+
+
+def _hit_rate(hits: int, misses: int):
+    return hits / (hits + misses) if hits + misses else None
+
+
+def _use_store(backend: str, work_dir: str) -> stores.VectorStore:
+    if backend == "memory":
+        store = stores.QdrantStore(QdrantClient(":memory:"))
+    elif backend == "local":
+        store = stores.LocalStore(os.path.join(work_dir, "vector_store"))
+    else:
+        raise ValueError(f"Unknown benchmark store '{backend}' (expected 'memory' or 'local').")
+    stores.set_vector_store(store)
+    return store
+
+
+def run_benchmarks(args) -> dict:
+    """Runs all stages and returns the report."""
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_backend": encoders.EMBEDDING_BACKEND,
+            "onnx_quantize": encoders.EMBEDDING_ONNX_QUANTIZE,
+            "embedding_threads": encoders.EMBEDDING_THREADS,
+        },
+        "config": vars(args),
+        "stages": {},
+    }
+    stages = report["stages"]
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as work_dir:
+        pdf_dir = os.path.join(work_dir, "pdfs")
+
+        with _stage(stages, "generate_corpus") as stage:
+            stage["pages"] = generate_pdfs(pdf_dir, args.pdfs, args.pages, args.words_per_page, args.seed)
+
+        store = _use_store(args.store, work_dir)
+
+        # Loading the model is reported separately so it does not skew ingestion throughput
+        with _stage(stages, "model_load"):
+            clients.warm_up(qdrant=False)
+
+        with _stage(stages, "ingestion") as stage:
+            embed.run_pdf_processing_pipeline(
+                pdf_files_directory=pdf_dir,
+                qdrant_collection_name=COLLECTION_NAME,
+                encode_batch_size=args.encode_batch_size,
+                upsert_batch_size=args.upsert_batch_size,
+                encode_workers=args.encode_workers,
+                extract_workers=args.extract_workers,
+            )
+        chunks = store.describe(COLLECTION_NAME).get("points_count") or 0
+        pages = stages["generate_corpus"]["pages"]
+        stage.update({
+            "pages": pages,
+            "chunks": chunks,
+            "pages_per_second": pages / stage["seconds"],
+            "chunks_per_second": chunks / stage["seconds"],
+        })
+
+        retrieve.COLLECTION_NAME = COLLECTION_NAME
+        queries = generate_queries(args.queries, args.repeat_fraction, args.seed)
+        cache.clear()
+        with _stage(stages, "retrieval") as stage:
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                retrieve.retrieve_relevant_texts(query=query, top_k=args.top_k)
+                latencies.append(time.perf_counter() - start)
+        cache_stats = cache.get_cache_stats()
+        stage.update({
+            "queries": len(queries),
+            "queries_per_second": len(queries) / stage["seconds"],
+            "latency": _latency_summary(latencies),
+            "result_cache_hit_rate": _hit_rate(cache_stats["result_hits"], cache_stats["result_misses"]),
+            "embedding_cache_hit_rate": _hit_rate(cache_stats["embedding_hits"], cache_stats["embedding_misses"]),
+            "cache_stats": cache_stats,
+        })
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=10, help="Number of synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF.")
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries to replay.")
+    parser.add_argument("--repeat-fraction", type=float, default=0.3,
+                        help="Fraction of replayed queries that repeat an earlier one.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--store", choices=["memory", "local"], default="memory",
+                        help="'memory' for Qdrant's in-memory mode, 'local' for the memory-mapped store.")
+    parser.add_argument("--encode-batch-size", type=int, default=embed.ENCODE_BATCH_SIZE)
+    parser.add_argument("--upsert-batch-size", type=int, default=embed.UPSERT_BATCH_SIZE)
+    parser.add_argument("--encode-workers", type=int, default=embed.ENCODE_WORKERS)
+    parser.add_argument("--extract-workers", type=int, default=embed.EXTRACT_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report["stages"], sys.stdout, indent=2)
+    print(f"\nBenchmark report written to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
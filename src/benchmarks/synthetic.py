@@ -0,0 +1,79 @@
+import os
+import random
+
+# Synthetic corpus for the benchmarks: PDFs whose pages mix a few topic sentences into
+# filler text, and queries about those topics, so retrieval returns meaningful hits.
+TOPICS = {
+    "solar energy": "Solar panels convert sunlight into electricity using photovoltaic cells on rooftops and farms.",
+    "ocean currents": "Ocean currents move warm water from the equator towards the poles and shape regional climate.",
+    "vaccine trials": "Vaccine trials compare immune responses between treated and placebo groups over several months.",
+    "supply chains": "Supply chains depend on ports, warehouses and trucking capacity to deliver goods on time.",
+    "neural networks": "Neural networks learn layered representations by adjusting weights with gradient descent.",
+    "medieval castles": "Medieval castles used thick stone walls, moats and towers to defend against sieges.",
+    "coffee farming": "Coffee farming at high altitude produces slower-ripening beans with more complex flavour.",
+    "interest rates": "Central banks raise interest rates to slow inflation and lower them to encourage lending.",
+}
+
+_FILLER_WORDS = (
+    "analysis report system value process result method data model section figure table "
+    "increase decrease period region sample measure effect factor level group case study "
+    "review approach design policy market cost growth risk quality standard program"
+).split()
+
+QUERY_TEMPLATES = [
+    "What does the document say about {topic}?",
+    "Summarize the section on {topic}.",
+    "How is {topic} described?",
+    "Key facts about {topic}",
+]
+
+
+def _page_text(rng: random.Random, words_per_page: int) -> str:
+    sentences = []
+    words = 0
+    while words < words_per_page:
+        if rng.random() < 0.25:
+            sentence = TOPICS[rng.choice(list(TOPICS))]
+        else:
+            sentence = " ".join(rng.choice(_FILLER_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return " ".join(sentences)
+
+
+def generate_pdfs(directory: str, num_pdfs: int, pages_per_pdf: int, words_per_page: int = 350, seed: int = 0):
+    """
+    Writes `num_pdfs` synthetic PDFs of `pages_per_pdf` text pages each into `directory`.
+
+    Returns:
+        int: The total number of pages written.
+    """
+    import pymupdf  # Only needed to generate the corpus
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for pdf_index in range(num_pdfs):
+        document = pymupdf.open()
+        for _ in range(pages_per_pdf):
+            page = document.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), _page_text(rng, words_per_page), fontsize=8)
+        document.save(os.path.join(directory, f"synthetic_{pdf_index:04d}.pdf"))
+        document.close()
+    return num_pdfs * pages_per_pdf
+
+
+def generate_queries(num_queries: int, repeat_fraction: float = 0.3, seed: int = 0):
+    """
+    Builds a query replay list. About `repeat_fraction` of the entries repeat an earlier
+    query (with different casing/spacing) to exercise the retrieval caches.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(num_queries):
+        if queries and rng.random() < repeat_fraction:
+            previous = rng.choice(queries)
+            queries.append(previous.upper() if rng.random() < 0.5 else f"  {previous}  ")
+        else:
+            query = rng.choice(QUERY_TEMPLATES).format(topic=rng.choice(list(TOPICS)))
+            queries.append(f"{query} Focus on {rng.choice(_FILLER_WORDS)}.")
+    return queries
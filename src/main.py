@@ -7,6 +7,84 @@ from .qdrant_db import *
 from strands import Agent
 from strands_tools import calculator
 from strands.models import BedrockModel
+from . import metrics
+from .answer_cache import answer_cache
+from .qdrant_db.packing import pack_hits
+
+
+ORCHESTRATOR_SYSTEM_PROMPT = "Você é um agente responsável por garantir a resposta correta para a pergunta do usuário. Para isso, fará uso de ferramentas e agentes disponíveis"
+
+# --- Speculative retrieval (opt-in) ---
+# ORCHESTRATOR_PREFETCH:
+#   "off"    - the orchestrator decides when to call the retrieval tools.
+#   "serve"  - the question is retrieved in the background while the first model call
+#              runs; a retrieve_relevant_texts call for the same query is served from it.
+#   "inject" - as "serve", but waits up to ORCHESTRATOR_PREFETCH_WAIT_SECONDS (retrieval
+#              is much faster than a model call) and adds the packed results to the
+#              prompt, which saves the model round trip that would decide to retrieve.
+ORCHESTRATOR_PREFETCH = os.getenv("ORCHESTRATOR_PREFETCH", "off").lower()
+ORCHESTRATOR_PREFETCH_WAIT_SECONDS = float(os.getenv("ORCHESTRATOR_PREFETCH_WAIT_SECONDS", "0.5"))
+ORCHESTRATOR_PREFETCH_MAX_TOKENS = int(os.getenv("ORCHESTRATOR_PREFETCH_MAX_TOKENS", "1500"))
+
+_orchestrator_model = None
+
+
+def get_orchestrator_model() -> BedrockModel:
+    """Returns the orchestrator's BedrockModel, shared by every orchestrator agent."""
+    global _orchestrator_model
+    if _orchestrator_model is None:
+        _orchestrator_model = BedrockModel(
+            model_id="us.anthropic.claude-3-5-haiku-20241022-v1:0",
+            region_name='us-east-1',
+            temperature=0.5,
+        )
+    return _orchestrator_model
+
+
+def build_orchestrator(**agent_kwargs) -> Agent:
+    """
+    Builds an orchestrator agent. The model and tools are shared, so this is cheap and
+    can be called once per conversation (see server.py). Extra arguments go to Agent,
+    e.g. `callback_handler=None` to disable printing the response.
+    """
+    return Agent(
+        tools=[calculator, retrieve.retrieve_relevant_texts, retrieve.retrieve_many, plotly_agent.generate_plot],
+        model=get_orchestrator_model(),
+        system_prompt=ORCHESTRATOR_SYSTEM_PROMPT,
+        **agent_kwargs,
+    )
+
+
+def prepare_prompt(question: str, prefetch: str = ORCHESTRATOR_PREFETCH) -> str:
+    """
+    Starts the speculative retrieval of `question` (see ORCHESTRATOR_PREFETCH) and
+    returns the prompt to send to the orchestrator: the question itself, or in "inject"
+    mode the question followed by the retrieved passages if they arrived in time.
+    """
+    if prefetch not in ("serve", "inject"):
+        return question
+    future = retrieve.prefetch(question)
+    if prefetch == "serve":
+        return question
+    try:
+        results = future.result(timeout=ORCHESTRATOR_PREFETCH_WAIT_SECONDS)
+    except Exception:
+        metrics.count("orchestrator_prefetch", result="late")
+        return question  # Still running; a matching tool call will be served from it
+    passages = pack_hits(results, ORCHESTRATOR_PREFETCH_MAX_TOKENS)
+    metrics.count("orchestrator_prefetch", result="injected" if passages else "empty")
+    if not passages:
+        return question
+    context = "\n\n".join(
+        f"[{i}] {p['source_pdf']}, páginas {p['page_start']}-{p['page_end']} (score {p['score']:.2f}):\n{p['text']}"
+        for i, p in enumerate(passages, start=1)
+    )
+    return (f"{question}\n\n"
+            f"<contexto_recuperado>\n"
+            f"Trechos dos documentos já recuperados com retrieve_relevant_texts para esta pergunta. "
+            f"Use-os antes de chamar as ferramentas de busca novamente.\n\n"
+            f"{context}\n"
+            f"</contexto_recuperado>")
 
 
 if __name__ == "__main__":
@@ -23,20 +101,20 @@ if __name__ == "__main__":
     #     qdrant_collection_name=COLLECTION_NAME
     # )
 
-    bedrock_model = BedrockModel(
-        model_id="us.anthropic.claude-3-5-haiku-20241022-v1:0",
-        region_name='us-east-1',
-        temperature=0.5,
-    )
-
-    agent = Agent(
-        tools=[calculator, retrieve.retrieve_relevant_texts, plotly_agent.generate_plot],
-        model=bedrock_model,
-        system_prompt="Você é um agente responsável por garantir a resposta correta para a pergunta do usuário. Para isso, fará uso de ferramentas e agentes disponíveis"
-    )
+    # For many questions, run the long-lived server instead: python -m src.server
+    question = "Sobre o que é o documento em questão? em seguida gere um gráfico sobre o documento"
+    answer = answer_cache.get(question)
+    if answer is None:
+        version = answer_cache.version()  # Before answering, so a concurrent ingestion makes the answer stale
+        agent = build_orchestrator()
 
+        # Initialize the agent
+        with metrics.span("orchestrator"):
+            answer = agent(prepare_prompt(question))
+        metrics.record_agent_usage("orchestrator", answer)
+        answer_cache.put(question, str(answer), version)
 
-    # Initialize the agent
-    answer = agent("Sobre o que é o documento em questão? em seguida gere um gráfico sobre o documento")
+    print(answer)
 
-    print(answer)
\ No newline at end of file
+    if metrics.is_enabled():
+        print(metrics.export_prometheus())
\ No newline at end of file
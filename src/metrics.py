@@ -0,0 +1,283 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+# Lightweight in-process instrumentation: timing spans and counters.
+#
+# Disabled by default; METRICS_ENABLED=true (or `enable()`) turns it on. While disabled,
+# `span` returns a shared no-op object and `count` / `observe` return immediately, so the
+# instrumented code paths pay one flag check. When METRICS_JSONL_PATH is set, every span
+# and observation is also appended to that file as one JSON object per line.
+#
+#     with metrics.span("query_encode", collection=name) as s:
+#         vector = encode(query)
+#         s.set(cache_hit=False)
+#
+# Aggregates are available through `snapshot()`, `export_jsonl()` and `export_prometheus()`.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH")
+METRICS_PREFIX = "rag"
+
+_lock = threading.Lock()
+_enabled = METRICS_ENABLED
+_counters = {}  # (name, labels) -> value
+_timings = {}  # (name, labels) -> [count, total seconds, max seconds]
+_events_file = None
+
+
+def enable(jsonl_path: str = None):
+    """Turns instrumentation on, optionally streaming events to `jsonl_path`."""
+    global _enabled, METRICS_JSONL_PATH, _events_file
+    with _lock:
+        _enabled = True
+        if jsonl_path:
+            if _events_file is not None:
+                _events_file.close()
+                _events_file = None
+            METRICS_JSONL_PATH = jsonl_path
+
+
+def disable():
+    """Turns instrumentation off. Aggregates collected so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _labels_key(labels: dict):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _emit(event: dict):
+    """Appends an event to the JSON lines file, if one is configured. Call with `_lock` held."""
+    global _events_file
+    if not METRICS_JSONL_PATH:
+        return
+    if _events_file is None:
+        _events_file = open(METRICS_JSONL_PATH, "a", encoding="utf-8", buffering=1)
+    _events_file.write(json.dumps(event, default=str) + "\n")
+
+
+def count(name: str, value: float = 1, **labels):
+    """Adds `value` to a counter."""
+    if not _enabled:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, attributes: dict = None, **labels):
+    """Records one timing, e.g. measured in another process or reported by a library."""
+    if not _enabled:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        timing = _timings.get(key)
+        if timing is None:
+            _timings[key] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+        _emit({"ts": time.time(), "type": "span", "name": name, "seconds": seconds,
+               "labels": labels, **({"attributes": attributes} if attributes else {})})
+
+
+class _Span:
+    __slots__ = ("name", "labels", "attributes", "_start")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.attributes = None
+        self._start = None
+
+    def set(self, **attributes):
+        """Attaches attributes (not labels) to the span's JSON lines event."""
+        if self.attributes is None:
+            self.attributes = {}
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self._start, self.attributes, **self.labels)
+        if exc_type is not None:
+            count(f"{self.name}_errors", **self.labels)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **labels):
+    """Returns a context manager that times its block under `name`."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+
+def timed_iter(iterable, name: str, exclude=None, **labels):
+    """
+    Wraps a lazy iterable (e.g. a generator) and records the total time spent producing
+    its items as one `name` observation once it is exhausted or closed.
+
+    `exclude`, if given, is called at the end and returns the seconds spent in an inner
+    iterable (e.g. the pages a chunker consumes) to leave out of the observation.
+    """
+    if not _enabled:
+        return iterable
+
+    def generator():
+        elapsed = 0.0
+        items = 0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    return
+                elapsed += time.perf_counter() - start
+                items += 1
+                yield item
+        finally:
+            if exclude is not None:
+                elapsed = max(0.0, elapsed - exclude())
+            observe(name, elapsed, {"items": items}, **labels)
+            count(f"{name}_items", items, **labels)
+
+    return generator()
+
+
+def traced_tool(func):
+    """
+    Decorator for agent tools: times each call as a `tool` span labelled with the tool's
+    name and counts failures. Apply it below `@tool` so the tool spec is unchanged.
+    """
+    labels = {"tool": func.__name__}
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span("tool", **labels):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def record_agent_usage(agent_name: str, result):
+    """
+    Records the token usage and model latency of one agent call from its AgentResult
+    (or from the Agent itself, e.g. after `stream_async`).
+
+    The counts are read from strands' EventLoopMetrics, which accumulate over the life
+    of an Agent; pooled agents and server sessions reset them between calls.
+    """
+    if not _enabled:
+        return
+    event_loop_metrics = getattr(result, "metrics", None) or getattr(result, "event_loop_metrics", None)
+    if event_loop_metrics is None:
+        return
+    usage = getattr(event_loop_metrics, "accumulated_usage", None) or {}
+    for key, metric in (("inputTokens", "agent_input_tokens"), ("outputTokens", "agent_output_tokens"),
+                        ("totalTokens", "agent_total_tokens")):
+        if key in usage:
+            count(metric, usage[key], agent=agent_name)
+    latency_ms = (getattr(event_loop_metrics, "accumulated_metrics", None) or {}).get("latencyMs")
+    if latency_ms is not None:
+        observe("agent_model_latency", latency_ms / 1000, usage or None, agent=agent_name)
+    count("agent_calls", agent=agent_name)
+
+
+def snapshot() -> dict:
+    """Returns the current counters and timing aggregates."""
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in _counters.items()]
+        timings = [{"name": name, "labels": dict(labels), "count": n, "sum_seconds": total,
+                    "max_seconds": maximum, "avg_seconds": total / n}
+                   for (name, labels), (n, total, maximum) in _timings.items()]
+    return {"counters": counters, "timings": timings}
+
+
+def export_jsonl(path: str = None) -> str:
+    """Returns the aggregates as JSON lines (one per metric), also writing them to `path` if given."""
+    data = snapshot()
+    lines = [json.dumps({"type": "counter", **c}) for c in data["counters"]]
+    lines += [json.dumps({"type": "timing", **t}) for t in data["timings"]]
+    text = "\n".join(lines) + ("\n" if lines else "")
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return text
+
+
+def _metric_name(name: str) -> str:
+    return f"{METRICS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def export_prometheus() -> str:
+    """Returns the aggregates in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    seen = set()
+    for c in sorted(data["counters"], key=lambda c: c["name"]):
+        name = _metric_name(c["name"]) + "_total"
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(c['labels'])} {c['value']}")
+    timings = sorted(data["timings"], key=lambda t: t["name"])
+    for t in timings:
+        name = _metric_name(t["name"]) + "_seconds"
+        labels = _format_labels(t["labels"])
+        if name not in seen:
+            lines.append(f"# TYPE {name} summary")
+            seen.add(name)
+        lines.append(f"{name}_count{labels} {t['count']}")
+        lines.append(f"{name}_sum{labels} {t['sum_seconds']}")
+    # A summary has no max sample, so each maximum is exported as its own gauge
+    for t in timings:
+        name = _metric_name(t["name"]) + "_seconds_max"
+        if name not in seen:
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(t['labels'])} {t['max_seconds']}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def reset():
+    """Clears all counters and timings."""
+    with _lock:
+        _counters.clear()
+        _timings.clear()
@@ -1 +1 @@
-from . import embed, retrieve
\ No newline at end of file
+from . import cache, encoders, clients, stores, embed, retrieve
\ No newline at end of file
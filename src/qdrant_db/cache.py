@@ -0,0 +1,148 @@
+import os
+import threading
+from cachetools import LRUCache, TTLCache
+
+# In-process caches for retrieval:
+# - query embeddings (LRU), since encoding is the expensive CPU part of a lookup;
+# - search results (LRU + TTL), keyed on (collection, query, top_k, score_threshold, ...).
+# Result entries of a collection are dropped whenever the ingestion pipeline of this
+# process writes to it; the TTL bounds staleness for writes made by other processes.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "512"))
+SEARCH_RESULT_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_RESULT_CACHE_TTL_SECONDS", "300"))
+
+_lock = threading.Lock()
+_query_embeddings = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+_search_results = TTLCache(maxsize=SEARCH_RESULT_CACHE_SIZE, ttl=SEARCH_RESULT_CACHE_TTL_SECONDS)
+_collection_versions = {}
+_stats = {
+    "embedding_hits": 0,
+    "embedding_misses": 0,
+    "result_hits": 0,
+    "result_misses": 0,
+    "result_invalidations": 0,
+}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for use as a cache key.
+
+    all-MiniLM-L6-v2 lowercases its input and ignores repeated whitespace, so these
+    variants produce the same embedding and can share a cache entry.
+    """
+    return " ".join(query.split()).casefold()
+
+
+def get_query_embedding(query: str, encode):
+    """
+    Returns the embedding of `query`, computing it with `encode(query)` on a cache miss.
+
+    Args:
+        query (str): The query text.
+        encode (Callable[[str], list[float]]): Computes the embedding of a query.
+
+    Returns:
+        list[float]: The query embedding.
+    """
+    key = normalize_query(query)
+    with _lock:
+        embedding = _query_embeddings.get(key)
+        if embedding is not None:
+            _stats["embedding_hits"] += 1
+            return embedding
+        _stats["embedding_misses"] += 1
+    embedding = encode(query)
+    with _lock:
+        _query_embeddings[key] = embedding
+    return embedding
+
+
+def get_query_embeddings(queries, encode_batch):
+    """
+    Returns the embeddings of several queries, encoding all cache misses in one batch.
+
+    Args:
+        queries (list[str]): The query texts.
+        encode_batch (Callable[[list[str]], list[list[float]]]): Computes the embeddings of a list of queries.
+
+    Returns:
+        list[list[float]]: One embedding per query, in order.
+    """
+    keys = [normalize_query(query) for query in queries]
+    embeddings = [None] * len(queries)
+    missing = {}  # key -> indices of queries with that key
+    with _lock:
+        for i, key in enumerate(keys):
+            embedding = _query_embeddings.get(key)
+            if embedding is not None:
+                _stats["embedding_hits"] += 1
+                embeddings[i] = embedding
+            else:
+                _stats["embedding_misses"] += 1
+                missing.setdefault(key, []).append(i)
+    if missing:
+        computed = encode_batch([queries[indices[0]] for indices in missing.values()])
+        with _lock:
+            for (key, indices), embedding in zip(missing.items(), computed):
+                _query_embeddings[key] = embedding
+                for i in indices:
+                    embeddings[i] = embedding
+    return embeddings
+
+
+def result_key(collection_name: str, query: str, top_k: int, score_threshold=None, *extra):
+    """Builds the result-cache key of a search. `extra` holds any other search parameters."""
+    return (collection_name, normalize_query(query), top_k, score_threshold) + tuple(extra)
+
+
+def get_results(key):
+    """Returns the cached results for `key`, or None on a miss."""
+    with _lock:
+        results = _search_results.get(key)
+        if results is None:
+            _stats["result_misses"] += 1
+            return None
+        _stats["result_hits"] += 1
+    # Copy the hits so callers cannot mutate the cached entry
+    return [dict(hit) for hit in results]
+
+
+def put_results(key, results):
+    """Stores the results of a search."""
+    with _lock:
+        _search_results[key] = [dict(hit) for hit in results]
+
+
+def invalidate_collection(collection_name: str):
+    """Drops the cached results of a collection. Called by the ingestion pipeline after writes."""
+    with _lock:
+        stale_keys = [key for key in _search_results.keys() if key[0] == collection_name]
+        for key in stale_keys:
+            _search_results.pop(key, None)
+        _collection_versions[collection_name] = _collection_versions.get(collection_name, 0) + 1
+        _stats["result_invalidations"] += 1
+
+
+def collection_version(collection_name: str) -> int:
+    """Returns a counter that changes every time `collection_name` is invalidated."""
+    with _lock:
+        return _collection_versions.get(collection_name, 0)
+
+
+def get_cache_stats() -> dict:
+    """Returns hit/miss counters and current sizes of the retrieval caches."""
+    with _lock:
+        stats = dict(_stats)
+        stats["embedding_cache_size"] = len(_query_embeddings)
+        stats["result_cache_size"] = len(_search_results)
+    return stats
+
+
+def clear():
+    """Empties both caches and resets the counters."""
+    with _lock:
+        _query_embeddings.clear()
+        _search_results.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,88 @@
+import os
+import threading
+from qdrant_client import QdrantClient
+from .encoders import EMBEDDING_BACKEND, Encoder, build_encoder, check_parity
+
+# Shared, lazily created Qdrant client and embedding encoder.
+# Nothing is connected or loaded at import time: the first call to a getter builds the
+# object, and every later call (from embed.py, retrieve.py, ...) reuses the same instance.
+QDRANT_URL = os.getenv("QDRANT_URL", "https://4b6b6bd6-689d-4874-a9ab-f7f2489ee76b.us-east-1-0.aws.cloud.qdrant.io:6333")
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_PARITY_CHECK = os.getenv("EMBEDDING_PARITY_CHECK", "false").lower() in ("1", "true", "yes")
+EMBEDDING_PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", "0.99"))
+
+_lock = threading.Lock()
+_qdrant_client = None
+_encoder = None
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Returns the shared Qdrant client, connecting on first use."""
+    global _qdrant_client
+    if _qdrant_client is not None:
+        return _qdrant_client
+    with _lock:
+        if _qdrant_client is None:
+            api_key = os.getenv("QDRANT_API_KEY")
+            if not api_key:
+                raise ValueError("QDRANT_API_KEY environment variable not set. Cannot initialize Qdrant client.")
+            try:
+                _qdrant_client = QdrantClient(url=QDRANT_URL, api_key=api_key)
+                print(f"Qdrant client initialized successfully for URL: {QDRANT_URL}")
+            except Exception as e:
+                raise RuntimeError(f"Failed to initialize Qdrant client: {e}")
+    return _qdrant_client
+
+
+def set_qdrant_client(client: QdrantClient):
+    """Replaces the shared Qdrant client, e.g. with `QdrantClient(":memory:")` for local runs."""
+    global _qdrant_client
+    with _lock:
+        _qdrant_client = client
+
+
+def get_encoder() -> Encoder:
+    """
+    Returns the shared encoder (see encoders.py for the backends), loading it on first use.
+
+    With EMBEDDING_PARITY_CHECK=true, a non-PyTorch encoder is compared against the
+    PyTorch model once at load time and rejected if the embeddings drift too far.
+    """
+    global _encoder
+    if _encoder is not None:
+        return _encoder
+    with _lock:
+        if _encoder is None:
+            try:
+                encoder = build_encoder(EMBEDDING_MODEL_NAME)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load {EMBEDDING_BACKEND} encoder for '{EMBEDDING_MODEL_NAME}': {e}")
+            if EMBEDDING_PARITY_CHECK and encoder.name != "torch":
+                parity = check_parity(encoder, build_encoder(EMBEDDING_MODEL_NAME, backend="torch"))
+                print(f"Encoder parity check: {parity}")
+                if parity["min_cosine"] < EMBEDDING_PARITY_MIN_COSINE:
+                    raise RuntimeError(f"Encoder '{encoder.name}' failed the parity check: minimum cosine "
+                                       f"{parity['min_cosine']:.4f} < {EMBEDDING_PARITY_MIN_COSINE}.")
+            _encoder = encoder
+            print(f"Embedding model '{EMBEDDING_MODEL_NAME}' loaded ({encoder.name}). Dimension: {encoder.dimension}")
+    return _encoder
+
+
+def get_embedding_dimension() -> int:
+    """Returns the dimension of the shared encoder's vectors."""
+    return get_encoder().dimension
+
+
+def warm_up(qdrant: bool = True, embedding_model: bool = True):
+    """
+    Eagerly builds the shared objects, e.g. at service start-up, so the first request
+    does not pay for the connection and model load.
+
+    Args:
+        qdrant (bool): Connect the Qdrant client.
+        embedding_model (bool): Load the encoder and run one encode to warm it up.
+    """
+    if qdrant:
+        get_qdrant_client()
+    if embedding_model:
+        get_encoder().encode(["warm-up"])
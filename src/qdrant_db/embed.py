@@ -1,42 +1,144 @@
+import gc
 import os
-import uuid
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pdfplumber # For reading PDF files
-from sentence_transformers import SentenceTransformer # For generating embeddings
-from qdrant_client import QdrantClient, models
-
-# --- Qdrant Client Initialization ---
-# Ensure your QDRANT_API_KEY environment variable is set
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_URL = "https://4b6b6bd6-689d-4874-a9ab-f7f2489ee76b.us-east-1-0.aws.cloud.qdrant.io:6333" # User's Qdrant URL
-
-qdrant_client = None # Initialize to None
-embedding_model = None # Initialize to None
-EMBEDDING_DIMENSION = None # Initialize to None
-
-if not QDRANT_API_KEY:
-    print("Error: QDRANT_API_KEY environment variable not set.")
-    exit()
-
-try:
-    qdrant_client = QdrantClient(
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-    )
-    print("Successfully connected to Qdrant.")
-except Exception as e:
-    print(f"Error connecting to Qdrant: {e}")
-    exit()
-
-# --- Configuration for PDF Processing and Embeddings ---
-EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
-try:
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    EMBEDDING_DIMENSION = embedding_model.get_sentence_embedding_dimension()
-    print(f"Embedding model '{EMBEDDING_MODEL_NAME}' loaded. Dimension: {EMBEDDING_DIMENSION}")
-except Exception as e:
-    print(f"Error loading sentence transformer model: {e}")
-    print("Please ensure 'sentence-transformers' is installed and the model name is correct.")
-    exit()
+import psutil # For the extraction memory ceiling
+import pypdfium2 # For cheap page counts when splitting large PDFs
+from .. import metrics
+from . import cache
+from . import manifest as ingest_manifest
+from .clients import get_embedding_dimension, get_encoder
+from .stores import VectorStore, as_vector_store, get_vector_store
+
+# The vector store (Qdrant by default, see stores.py) and the embedding model are shared
+# with retrieve.py and created lazily on first use, so importing this module is cheap.
+
+# --- Batching configuration for ingestion ---
+# Chunks are encoded ENCODE_BATCH_SIZE at a time, and points are sent to Qdrant in
+# requests of UPSERT_BATCH_SIZE points. ENCODE_WORKERS > 1 starts a multi-process
+# encoding pool (useful on many-core hosts).
+ENCODE_BATCH_SIZE = int(os.getenv("EMBED_ENCODE_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+ENCODE_WORKERS = int(os.getenv("EMBED_ENCODE_WORKERS", "1"))
+
+# --- Parallel extraction configuration ---
+# PDFs (or ranges of PAGES_PER_TASK pages of large PDFs) are extracted by a pool of
+# EXTRACT_WORKERS processes. At most EXTRACT_QUEUE_DEPTH tasks are in flight ahead of
+# the embedding stage (0 means twice the number of workers).
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+EXTRACT_QUEUE_DEPTH = int(os.getenv("PDF_EXTRACT_QUEUE_DEPTH", "0"))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "64"))
+
+# --- Extraction memory ceiling ---
+# Pages are extracted one at a time and their layout objects released right after. If
+# the extracting process still grows past EXTRACT_MEMORY_CEILING_MB (pdfminer keeps
+# parsed objects of the whole document), the PDF is closed and reopened at the next
+# page, for the remaining page range only. RSS is checked every EXTRACT_RSS_CHECK_PAGES
+# pages. 0 disables the ceiling. The ceiling applies to the RSS of the whole extracting
+# process: with in-process extraction (PDF_EXTRACT_WORKERS=1) that includes the encoder,
+# so set it well above the model's footprint.
+EXTRACT_MEMORY_CEILING_MB = int(os.getenv("PDF_EXTRACT_MEMORY_CEILING_MB", "1024"))
+EXTRACT_RSS_CHECK_PAGES = 16
+
+# --- Chunking configuration (in words) ---
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 30
+
+
+class PdfExtractionError(RuntimeError):
+    """Raised while streaming the pages of a PDF that cannot be read."""
+
+
+def _rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _page_count(pdf_path) -> int:
+    """Counts the pages of a PDF with pypdfium2, without parsing their content."""
+    document = pypdfium2.PdfDocument(pdf_path)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def iter_pages(pdf_path, page_start=0, page_end=None, memory_ceiling_mb=EXTRACT_MEMORY_CEILING_MB):
+    """
+    Yields the text of a range of pages from a PDF file, one page at a time.
+
+    Each page's cached layout objects are released as soon as its text is extracted,
+    and the document is reopened whenever the process exceeds `memory_ceiling_mb`, so
+    memory stays flat regardless of the number of pages.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        page_start (int): Index of the first page to extract (0-based, inclusive).
+        page_end (int, optional): Index of the last page (exclusive). Defaults to the end.
+        memory_ceiling_mb (int): RSS of the whole process above which the document is
+                                 reopened (0 disables).
+
+    Yields:
+        tuple[int, str]: (1-based page number, page text) for every page with text.
+    """
+    next_page = page_start  # 0-based index of the next page to extract
+    while True:
+        page_numbers = list(range(next_page + 1, page_end + 1)) if page_end is not None else None
+        if page_numbers == []:
+            return
+        reopen = False
+        with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+            for page in pdf.pages:
+                if page.page_number <= next_page:
+                    continue
+                page_text = page.extract_text()
+                page.close()  # Drops the page's cached chars, layout and text map
+                next_page = page.page_number
+                if page_text:
+                    yield page.page_number, page_text
+                if (memory_ceiling_mb and next_page % EXTRACT_RSS_CHECK_PAGES == 0
+                        and _rss_mb() > memory_ceiling_mb):
+                    reopen = True
+                    break
+        if not reopen:
+            return
+        if page_end is None:
+            # Reopening with pages=None would build Page objects for the whole document again
+            page_end = _page_count(pdf_path)
+        gc.collect()
+        print(f"Extraction of {pdf_path} exceeded {memory_ceiling_mb} MB; reopening at page {next_page + 1}.")
+        metrics.count("pdf_extract_reopens")
+
+
+def extract_pages(pdf_path, page_start=0, page_end=None):
+    """
+    Extracts the text of a range of pages from a PDF file.
+
+    Runs in the extraction worker processes, so it raises instead of printing errors.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        page_start (int): Index of the first page to extract (0-based, inclusive).
+        page_end (int, optional): Index of the last page (exclusive). Defaults to the end.
+
+    Returns:
+        list[tuple[int, str]]: (1-based page number, page text) for every page with text.
+    """
+    return list(iter_pages(pdf_path, page_start, page_end))
+
+
+def _extract_pages_timed(pdf_path, page_start=0, page_end=None):
+    """Runs `extract_pages` in a worker process and also returns its duration, for metrics."""
+    start = time.perf_counter()
+    pages = extract_pages(pdf_path, page_start, page_end)
+    return pages, time.perf_counter() - start
+
+
+def _join_pages(pages):
+    """Concatenates extracted pages into one document, marking the page boundaries."""
+    return "".join(f"\n--- Page {page_number} ---\n{page_text}" for page_number, page_text in pages).strip()
 
 
 def extract_text_from_pdf(pdf_path):
@@ -49,18 +151,189 @@ def extract_text_from_pdf(pdf_path):
     Returns:
         str: The concatenated text from the PDF, or None if an error occurs.
     """
-    full_text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += f"\n--- Page {page_num + 1} ---\n" + page_text
-        return full_text.strip()
+        return _join_pages(extract_pages(pdf_path))
     except Exception as e:
         print(f"Error reading PDF {pdf_path}: {e}")
         return None
 
+
+def _list_pdfs(pdf_directory):
+    """Returns the PDF filenames of a directory in a stable order."""
+    return sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith(".pdf"))
+
+
+def _plan_extraction_tasks(pdf_directory, pages_per_task, filenames=None):
+    """
+    Yields (filename, pdf_path, page_start, page_end, is_last_task) extraction tasks.
+
+    PDFs with more than `pages_per_task` pages are split into page ranges so a single
+    large document can be extracted by several workers.
+    """
+    for filename in (filenames if filenames is not None else _list_pdfs(pdf_directory)):
+        pdf_path = os.path.join(pdf_directory, filename)
+
+        page_count = None
+        if pages_per_task > 0:
+            try:
+                page_count = _page_count(pdf_path)
+            except Exception:
+                page_count = None  # Let the extraction worker report the error
+
+        if page_count is None or page_count <= pages_per_task:
+            yield filename, pdf_path, 0, None, True
+            continue
+        for page_start in range(0, page_count, pages_per_task):
+            page_end = min(page_start + pages_per_task, page_count)
+            yield filename, pdf_path, page_start, page_end, page_end == page_count
+
+
+def iter_extracted_documents(
+    pdf_directory: str,
+    extract_workers: int = EXTRACT_WORKERS,
+    queue_depth: int = EXTRACT_QUEUE_DEPTH,
+    pages_per_task: int = PAGES_PER_TASK,
+    filenames=None,
+):
+    """
+    Extracts the PDFs of a directory in a process pool and yields them in directory order.
+
+    This is the producer side of the ingestion pipeline: while the caller embeds and
+    upserts one document, the pool keeps extracting up to `queue_depth` tasks ahead.
+    Each document is yielded as a lazy stream of pages, so the caller can chunk and
+    embed its first pages while the rest are still being extracted, and never holds
+    more than one task's worth of pages.
+
+    Args:
+        pdf_directory (str): Path to the directory containing PDF files.
+        extract_workers (int): Number of extraction processes. 1 extracts in-process, page by page.
+        queue_depth (int): Maximum number of extraction tasks in flight (0 = 2 * workers).
+        pages_per_task (int): Split PDFs with more pages than this into page ranges (0 disables).
+        filenames (list[str], optional): Only extract these PDFs of the directory.
+
+    Yields:
+        tuple[str, Iterator[tuple[int, str]]]: The PDF filename and an iterator of its
+            (page number, page text) pairs. The iterator raises PdfExtractionError if the
+            PDF cannot be read; it must be consumed (or abandoned) before the next document.
+    """
+    if extract_workers <= 1:
+        # In-process extraction streams page by page, so there is no need to split files
+        for filename, pdf_path, _, _, _ in _plan_extraction_tasks(pdf_directory, 0, filenames):
+            yield filename, _stream_pages(pdf_path)
+        return
+
+    tasks = _plan_extraction_tasks(pdf_directory, pages_per_task, filenames)
+    max_in_flight = queue_depth if queue_depth > 0 else 2 * extract_workers
+    with ProcessPoolExecutor(max_workers=extract_workers) as executor:
+        pending = deque()
+
+        def fill_queue():
+            while len(pending) < max_in_flight:
+                task = next(tasks, None)
+                if task is None:
+                    return
+                _, pdf_path, page_start, page_end, _ = task
+                pending.append((task, executor.submit(_extract_pages_timed, pdf_path, page_start, page_end)))
+
+        def document_pages(filename):
+            # Split tasks of one file are contiguous in `pending`, in page order
+            while pending and pending[0][0][0] == filename:
+                (_, pdf_path, _, _, is_last), future = pending.popleft()
+                fill_queue()
+                try:
+                    # Time the consumer spends blocked on extraction, and the extraction itself
+                    with metrics.span("pdf_extract_wait"):
+                        result, seconds = future.result()
+                except Exception as e:
+                    raise PdfExtractionError(f"Error reading PDF {pdf_path}: {e}") from e
+                metrics.observe("pdf_extract", seconds, {"pdf": filename, "pages": len(result)}, mode="worker")
+                metrics.count("pdf_pages_extracted", len(result))
+                yield from result
+                if is_last:
+                    return
+
+        fill_queue()
+        while pending:
+            filename = pending[0][0][0]
+            pages = document_pages(filename)
+            yield filename, pages
+            pages.close()
+            # Skip whatever the caller did not consume (e.g. after an extraction error)
+            while pending and pending[0][0][0] == filename:
+                pending.popleft()[1].cancel()
+                fill_queue()
+
+
+def _stream_pages(pdf_path):
+    """Streams the pages of a PDF in-process, wrapping read errors in PdfExtractionError."""
+    try:
+        for page in metrics.timed_iter(iter_pages(pdf_path), "pdf_extract", mode="serial"):
+            metrics.count("pdf_pages_extracted")
+            yield page
+    except Exception as e:
+        raise PdfExtractionError(f"Error reading PDF {pdf_path}: {e}") from e
+
+_WORD_PATTERN = re.compile(r"\S+")
+
+
+def iter_chunks(pages, chunk_size=256, overlap=30):
+    """
+    Splits a stream of pages into overlapping word chunks in a single pass.
+
+    Pages are consumed lazily and only the current window of `chunk_size` words is kept
+    in memory, so cost grows linearly with the document. Every chunk records where it
+    came from, so retrieved chunks can cite exact pages.
+
+    Args:
+        pages (Iterable[tuple[int, str]]): (page number, page text) pairs, in order.
+        chunk_size (int): The number of words per chunk.
+        overlap (int): The number of words shared by consecutive chunks.
+
+    Yields:
+        dict: A chunk with the keys:
+            - 'text': The chunk text (words joined by single spaces).
+            - 'page_start' / 'page_end': Pages of the first and last word.
+            - 'char_start' / 'char_end': Character offsets of the first word in `page_start`
+              and of the end of the last word in `page_end`.
+            - 'word_start' / 'word_end': Word offsets in the document (end exclusive).
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    step = chunk_size - overlap
+
+    window = deque()  # (word, page number, char start, char end)
+    word_start = 0  # Document offset of window[0]
+    new_words = 0  # Words added since the last emitted chunk
+
+    def make_chunk():
+        first, last = window[0], window[-1]
+        return {
+            "text": " ".join(word for word, _, _, _ in window),
+            "page_start": first[1],
+            "page_end": last[1],
+            "char_start": first[2],
+            "char_end": last[3],
+            "word_start": word_start,
+            "word_end": word_start + len(window),
+        }
+
+    for page_number, page_text in pages:
+        if not page_text:
+            continue
+        for match in _WORD_PATTERN.finditer(page_text):
+            window.append((match.group(), page_number, match.start(), match.end()))
+            new_words += 1
+            if len(window) == chunk_size:
+                yield make_chunk()
+                new_words = 0
+                for _ in range(step):
+                    window.popleft()
+                word_start += step
+
+    if new_words:
+        yield make_chunk()
+
+
 def chunk_text(text, chunk_size=512, overlap=50):
     """
     Splits text into smaller chunks.
@@ -77,138 +350,373 @@ def chunk_text(text, chunk_size=512, overlap=50):
     """
     if not text:
         return []
-    words = text.split()
-    if not words:
-        return []
+    return [chunk["text"] for chunk in iter_chunks([(1, text)], chunk_size=chunk_size, overlap=overlap)]
+
+
+def _batched(items, batch_size):
+    """Yields consecutive slices of `items` with at most `batch_size` elements."""
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+class _UpsertStream:
+    """
+    Buffers points and sends them to the vector store in fixed-size batches.
+
+    Each batch is upserted on a background thread so the caller can encode the next
+    batch in the meantime. At most one request is in flight, which keeps memory bounded.
+    """
+
+    def __init__(self, store: VectorStore, collection_name: str, batch_size: int):
+        self._store = store
+        self._collection_name = collection_name
+        self._batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qdrant-upsert")
+        self._buffer = []
+        self._pending = None
+        self.upserted = 0
+        self.failed_ids = set()
+
+    def add(self, points):
+        """Queues (point id, vector, payload) tuples for upserting."""
+        self._buffer.extend(points)
+        while len(self._buffer) >= self._batch_size:
+            batch = self._buffer[:self._batch_size]
+            del self._buffer[:self._batch_size]
+            self._submit(batch)
+
+    def close(self):
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = []
+        self._wait()
+        self._executor.shutdown(wait=True)
+
+    def _submit(self, batch):
+        self._wait()
+        ids, vectors, payloads = zip(*batch)
+        future = self._executor.submit(self._upsert, ids, vectors, payloads)
+        self._pending = (future, batch)
+
+    def _upsert(self, ids, vectors, payloads):
+        with metrics.span("vector_store_upsert", collection=self._collection_name) as span:
+            span.set(points=len(ids))
+            self._store.upsert(self._collection_name, ids, vectors, payloads)
+
+    def _wait(self):
+        if self._pending is None:
+            return
+        future, batch = self._pending
+        self._pending = None
+        size = len(batch)
+        try:
+            future.result()
+            self.upserted += size
+            metrics.count("points_upserted", size, collection=self._collection_name)
+            cache.invalidate_collection(self._collection_name)
+            print(f"  Upserted batch of {size} points to '{self._collection_name}'.")
+        except Exception as e:
+            self.failed_ids.update(point_id for point_id, _, _ in batch)
+            print(f"Error upserting batch of {size} points to the vector store: {e}")
+
+
+def encode_chunks(chunks, batch_size=ENCODE_BATCH_SIZE, pool=None):
+    """
+    Encodes a list of text chunks in batches.
+
+    Args:
+        chunks (list[str]): The texts to encode.
+        batch_size (int): Number of texts per forward pass.
+        pool (optional): A pool from the encoder's `start_pool`. When given, encoding is
+                         spread across its worker processes.
 
-    chunks = []
-    current_pos = 0
-    while current_pos < len(words):
-        end_pos = min(current_pos + chunk_size, len(words))
-        chunks.append(" ".join(words[current_pos:end_pos]))
-        current_pos += (chunk_size - overlap)
-        if current_pos >= len(words) and end_pos < len(words) and (len(words) - current_pos + chunk_size - overlap) < overlap : # ensure last chunk is captured
-            chunks.append(" ".join(words[current_pos - (chunk_size - overlap) + (chunk_size - overlap) :]))
-            break
-        elif current_pos >= len(words):
-            break
-
-    # Ensure the very last part of the text is captured if the loop condition misses it
-    if chunks and " ".join(words).endswith(chunks[-1].split()[-1]):
-        pass
-    elif len(words) > 0 :
-        start_of_potential_last_chunk = max(0, len(words) - chunk_size)
-        potential_last_chunk_text = " ".join(words[start_of_potential_last_chunk:])
-
-        is_already_captured = False
-        if chunks:
-            last_captured_chunk_words = chunks[-1].split()
-            potential_last_chunk_words = potential_last_chunk_text.split()
-            if len(last_captured_chunk_words) >= len(potential_last_chunk_words):
-                if last_captured_chunk_words[-len(potential_last_chunk_words):] == potential_last_chunk_words:
-                    is_already_captured = True
-
-        if not is_already_captured and potential_last_chunk_text:
-            if not chunks or not chunks[-1].endswith(" ".join(words[-(chunk_size//2):])):
-                chunks.append(potential_last_chunk_text)
-
-    chunks = [chunk for chunk in chunks if chunk.strip()]
-    return chunks
-
-
-def upload_pdfs_to_qdrant(client: QdrantClient, pdf_directory: str, collection_name: str):
+    Returns:
+        numpy.ndarray: One embedding per chunk.
+    """
+    encoder = get_encoder()
+    with metrics.span("chunk_encode", backend=encoder.name, pool=pool is not None) as span:
+        span.set(chunks=len(chunks))
+        if pool is not None:
+            vectors = encoder.encode_with_pool(chunks, pool, batch_size=batch_size)
+        else:
+            vectors = encoder.encode(chunks, batch_size=batch_size)
+    metrics.count("chunks_encoded", len(chunks), backend=encoder.name)
+    return vectors
+
+
+def upload_pdfs_to_qdrant(
+    client,
+    pdf_directory: str,
+    collection_name: str,
+    encode_batch_size: int = ENCODE_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    encode_workers: int = ENCODE_WORKERS,
+    extract_workers: int = EXTRACT_WORKERS,
+    extract_queue_depth: int = EXTRACT_QUEUE_DEPTH,
+    pages_per_task: int = PAGES_PER_TASK,
+    incremental: bool = False,
+    manifest_path: str = None,
+    quantization: str = None,
+):
     """
     Processes PDF files from a directory, generates embeddings, and uploads them to Qdrant.
 
+    PDFs are extracted by a process pool (see `iter_extracted_documents`) while this
+    function embeds and upserts the documents that are already extracted. Chunks are
+    encoded in batches and upserted in fixed-size requests; the upsert of one batch
+    overlaps with the encoding of the next.
+
+    Point IDs are derived from (source_pdf, chunk hash), so re-runs overwrite instead of
+    duplicating. In incremental mode, unchanged files (by content hash) are skipped and
+    only new or changed chunks are embedded. In both modes, points of chunks or files that
+    no longer exist (according to the manifest) are deleted.
+
     Args:
-        client (QdrantClient): An initialized Qdrant client.
+        client (QdrantClient | VectorStore): An initialized Qdrant client, or any vector
+                                             store (e.g. a local one, see stores.py).
         pdf_directory (str): Path to the directory containing PDF files.
         collection_name (str): Name of the Qdrant collection to use/create.
+        encode_batch_size (int): Number of chunks per embedding forward pass.
+        upsert_batch_size (int): Number of points per Qdrant upsert request.
+        encode_workers (int): If greater than 1, encode with a multi-process pool of this size.
+        extract_workers (int): Number of PDF extraction processes.
+        extract_queue_depth (int): Maximum number of extraction tasks in flight (0 = 2 * workers).
+        pages_per_task (int): Split PDFs with more pages than this into page ranges (0 disables).
+        incremental (bool): Only re-embed what changed since the last run, based on the manifest.
+        manifest_path (str, optional): Where to keep the ingestion manifest. Defaults to a
+                                       per-collection file inside the PDF directory.
+        quantization (str, optional): "scalar" or "binary" to create the collection with quantized
+                                      vectors (Qdrant only). Defaults to QDRANT_QUANTIZATION.
     """
     if not os.path.isdir(pdf_directory):
         print(f"Error: PDF directory '{pdf_directory}' not found.")
         return
 
+    store = as_vector_store(client)
     try:
-        collections = client.get_collections()
-        collection_names = [c.name for c in collections.collections]
-        if collection_name not in collection_names:
-            print(f"Collection '{collection_name}' not found. Creating it...")
-            client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=EMBEDDING_DIMENSION,
-                    distance=models.Distance.COSINE
-                )
-            )
-            print(f"Collection '{collection_name}' created successfully.")
-        else:
-            print(f"Using existing collection '{collection_name}'.")
+        store.ensure_collection(collection_name, get_embedding_dimension(), quantization=quantization)
     except Exception as e:
-        print(f"Error interacting with Qdrant collections: {e}")
+        print(f"Error interacting with vector store collections: {e}")
         return
 
-    points_to_upsert = []
-    for filename in os.listdir(pdf_directory):
-        if filename.lower().endswith(".pdf"):
-            pdf_path = os.path.join(pdf_directory, filename)
-            print(f"\nProcessing PDF: {pdf_path}...")
-
-            document_text = extract_text_from_pdf(pdf_path)
-            if not document_text:
-                print(f"No text extracted from {filename}. Skipping.")
-                continue
-            print(f"Extracted {len(document_text)} characters from {filename}.")
-
-            text_chunks = chunk_text(document_text, chunk_size=256, overlap=30)
-            if not text_chunks:
-                print(f"No text chunks generated for {filename}. Skipping.")
-                continue
-            print(f"Split '{filename}' into {len(text_chunks)} chunks.")
-
-            for i, chunk in enumerate(text_chunks):
+    manifest_path = manifest_path or ingest_manifest.default_manifest_path(pdf_directory, collection_name)
+    # The previous manifest is loaded in both modes: a full run re-embeds every chunk, but
+    # still needs the old chunk hashes to delete the points of chunks and files that are gone
+    manifest = ingest_manifest.IngestionManifest.load(manifest_path, collection_name)
+
+    pdf_filenames = _list_pdfs(pdf_directory)
+    file_hashes = {filename: ingest_manifest.file_hash(os.path.join(pdf_directory, filename))
+                   for filename in pdf_filenames}
+    stale_point_ids = []
+    for filename in list(manifest.files):
+        if filename not in file_hashes:
+            print(f"'{filename}' no longer exists. Removing its points.")
+            stale_point_ids.extend(manifest.point_ids(filename))
+            manifest.forget(filename)
+    if incremental:
+        unchanged = [f for f in pdf_filenames if manifest.is_unchanged(f, file_hashes[f])]
+        if unchanged:
+            print(f"Skipping {len(unchanged)} unchanged PDF(s).")
+        pdf_filenames = [f for f in pdf_filenames if f not in unchanged]
+
+    pool = None
+    if encode_workers > 1:
+        pool = get_encoder().start_pool(encode_workers)
+        if pool is not None:
+            print(f"Started multi-process encoding pool with {encode_workers} workers.")
+
+    stream = _UpsertStream(store, collection_name, upsert_batch_size)
+    documents = iter_extracted_documents(
+        pdf_directory,
+        extract_workers=extract_workers,
+        queue_depth=extract_queue_depth,
+        pages_per_task=pages_per_task,
+        filenames=pdf_filenames,
+    )
+    renumbered_points = []
+    try:
+        for filename, pages in documents:
+            print(f"\nProcessing PDF: {os.path.join(pdf_directory, filename)}...")
+            extracted = {"pages": 0, "chars": 0, "seconds": 0.0}
+
+            def counted(pages):
+                # Time spent producing pages is extraction (or waiting for it), not chunking
+                iterator = iter(pages)
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        page = next(iterator, None)
+                    finally:
+                        extracted["seconds"] += time.perf_counter() - start
+                    if page is None:
+                        return
+                    extracted["pages"] += 1
+                    extracted["chars"] += len(page[1])
+                    yield page
+
+            # Pages stream from the extractor into the chunker, and chunks out of it; in
+            # incremental mode only those whose hash is not in the manifest yet are embedded,
+            # one upsert batch at a time.
+            previous_chunks = manifest.chunks(filename)
+            previous_pending = manifest.pending(filename)
+            current_chunks = {}
+            failed_hashes = set()  # Kept in the manifest (never treated as stale) and retried next run
+            pending = []
+
+            def flush_pending():
                 try:
-                    vector = embedding_model.encode(chunk).tolist()
-                    point_id = str(uuid.uuid4())
+                    vectors = encode_chunks([chunk["text"] for chunk in pending],
+                                            batch_size=encode_batch_size, pool=pool)
+                except Exception as e:
+                    print(f"Error encoding chunks {pending[0]['chunk_number']}-{pending[-1]['chunk_number']} "
+                          f"from {filename}: {e}")
+                    failed_hashes.update(chunk["chunk_hash"] for chunk in pending)
+                    file_hashes[filename] = None  # Retry this file on the next run
+                    return
+                points = []
+                for chunk, vector in zip(pending, vectors):
                     payload = {
                         "source_pdf": filename,
-                        "chunk_number": i + 1,
-                        "text": chunk,
-                        "original_length_chars": len(chunk),
+                        **chunk,
+                        "original_length_chars": len(chunk["text"]),
                     }
-                    points_to_upsert.append(models.PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload=payload
-                    ))
-                    print(f"  Prepared chunk {i+1}/{len(text_chunks)} for {filename} (ID: {point_id})")
-                except Exception as e:
-                    print(f"Error encoding or preparing point for chunk {i+1} from {filename}: {e}")
-
-            if points_to_upsert:
-                try:
-                    client.upsert(collection_name=collection_name, points=points_to_upsert)
-                    print(f"Successfully upserted {len(points_to_upsert)} points from {filename} to '{collection_name}'.")
-                    points_to_upsert = []
-                except Exception as e:
-                    print(f"Error upserting points to Qdrant for {filename}: {e}")
-                    points_to_upsert = []
+                    points.append((ingest_manifest.point_id(filename, chunk["chunk_hash"]), vector, payload))
+                print(f"  Encoded chunks {pending[0]['chunk_number']}-{pending[-1]['chunk_number']} for {filename}.")
+                stream.add(points)
+
+            chunk_count = 0
+            embedded_count = 0
+            chunks = metrics.timed_iter(iter_chunks(counted(pages), CHUNK_SIZE, CHUNK_OVERLAP), "chunking",
+                                        exclude=lambda: extracted["seconds"])
+            try:
+                for chunk_number, chunk in enumerate(chunks, start=1):
+                    chunk_count = chunk_number
+                    text_hash = ingest_manifest.chunk_hash(chunk["text"])
+                    if text_hash in current_chunks:
+                        continue  # Identical chunk text maps to the same point
+                    current_chunks[text_hash] = chunk_number
+                    if incremental and text_hash in previous_chunks and text_hash not in previous_pending:
+                        if previous_chunks[text_hash] != chunk_number:
+                            position = {key: value for key, value in chunk.items() if key != "text"}
+                            position["chunk_number"] = chunk_number
+                            renumbered_points.append((ingest_manifest.point_id(filename, text_hash), position))
+                        continue
+                    pending.append({"chunk_number": chunk_number, "chunk_hash": text_hash, **chunk})
+                    embedded_count += 1
+                    if len(pending) >= upsert_batch_size:
+                        flush_pending()
+                        pending = []
+            except PdfExtractionError as e:
+                print(e)
+                if pending:
+                    flush_pending()
+                # Keep every point of the file (old and new) and retry it on the next run;
+                # stale points are only removed after a complete extraction
+                if previous_chunks or current_chunks:
+                    manifest.record(filename, None, {**previous_chunks, **current_chunks},
+                                    previous_pending | failed_hashes)
+                continue
+            if pending:
+                flush_pending()
+                pending = []
 
-    print("\nPDF processing and uploading complete.")
+            if not extracted["pages"]:
+                print(f"No text extracted from {filename}. Skipping.")
+                continue
+            print(f"Extracted {extracted['chars']} characters from {extracted['pages']} pages of {filename}.")
+            if not chunk_count:
+                print(f"No text chunks generated for {filename}. Skipping.")
+                continue
+            print(f"Split '{filename}' into {chunk_count} chunks; embedded {embedded_count} new or changed.")
+            # Failed chunks are in current_chunks too, so their existing points are not deleted
+            stale_point_ids.extend(ingest_manifest.point_id(filename, h)
+                                   for h in previous_chunks if h not in current_chunks)
+            manifest.record(filename, file_hashes[filename], current_chunks, failed_hashes)
+    finally:
+        documents.close()
+        stream.close()
+        if pool is not None:
+            get_encoder().stop_pool(pool)
+
+    if stream.failed_ids:
+        # Keep failed chunks tracked (their points may exist from an earlier run), but mark
+        # them pending and forget the file hash so the next run embeds them again
+        for filename, entry in list(manifest.files.items()):
+            failed = {h for h in entry["chunks"] if ingest_manifest.point_id(filename, h) in stream.failed_ids}
+            if failed:
+                manifest.record(filename, None, entry["chunks"], manifest.pending(filename) | failed)
+
+    _renumber_points(store, collection_name, renumbered_points, upsert_batch_size)
+    _delete_points(store, collection_name, stale_point_ids, upsert_batch_size)
+    cache.invalidate_collection(collection_name)
 
-def run_pdf_processing_pipeline(pdf_files_directory: str, qdrant_collection_name: str):
+    try:
+        manifest.save()
+    except OSError as e:
+        print(f"Could not write manifest '{manifest.path}': {e}")
+
+    print(f"\nPDF processing and uploading complete. Upserted {stream.upserted} points "
+          f"({len(stream.failed_ids)} failed), removed {len(stale_point_ids)} stale points.")
+
+
+def _renumber_points(store: VectorStore, collection_name: str, renumbered_points, batch_size: int):
+    """Updates the position payload (chunk number, pages, offsets) of unchanged chunks that moved within their PDF."""
+    for batch in _batched(renumbered_points, batch_size):
+        try:
+            store.set_payload(collection_name, batch)
+        except Exception as e:
+            print(f"Error updating chunk positions in the vector store: {e}")
+
+
+def _delete_points(store: VectorStore, collection_name: str, point_ids, batch_size: int):
+    """Deletes points of chunks or files that no longer exist."""
+    for batch in _batched(point_ids, batch_size):
+        try:
+            store.delete(collection_name, batch)
+            print(f"  Deleted {len(batch)} stale points from '{collection_name}'.")
+        except Exception as e:
+            print(f"Error deleting stale points from the vector store: {e}")
+
+
+def run_pdf_processing_pipeline(
+    pdf_files_directory: str,
+    qdrant_collection_name: str,
+    encode_batch_size: int = ENCODE_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    encode_workers: int = ENCODE_WORKERS,
+    extract_workers: int = EXTRACT_WORKERS,
+    extract_queue_depth: int = EXTRACT_QUEUE_DEPTH,
+    pages_per_task: int = PAGES_PER_TASK,
+    incremental: bool = False,
+    manifest_path: str = None,
+    quantization: str = None,
+):
     """
     Main pipeline function to process PDFs and upload them to Qdrant.
 
     Args:
         pdf_files_directory (str): Path to the directory containing PDF files.
         qdrant_collection_name (str): Name of the Qdrant collection to use/create.
+        encode_batch_size (int): Number of chunks per embedding forward pass.
+        upsert_batch_size (int): Number of points per Qdrant upsert request.
+        encode_workers (int): If greater than 1, encode with a multi-process pool of this size.
+        extract_workers (int): Number of PDF extraction processes.
+        extract_queue_depth (int): Maximum number of extraction tasks in flight (0 = 2 * workers).
+        pages_per_task (int): Split PDFs with more pages than this into page ranges (0 disables).
+        incremental (bool): Only re-embed what changed since the last run, based on the manifest.
+        manifest_path (str, optional): Where to keep the ingestion manifest. Defaults to a
+                                       per-collection file inside the PDF directory.
+        quantization (str, optional): "scalar" or "binary" to create the collection with quantized
+                                      vectors (Qdrant only). Defaults to QDRANT_QUANTIZATION.
     """
     print("Starting PDF to Qdrant upload process...")
 
-    # Ensure client and model are initialized (they are global in this script's context)
-    if not qdrant_client or not embedding_model:
-        print("Error: Qdrant client or embedding model not initialized. Exiting.")
+    # Connect to the vector store and load the embedding model (shared, created on first use)
+    try:
+        store = get_vector_store()
+        get_encoder()
+    except Exception as e:
+        print(f"Error: vector store or embedding model could not be initialized: {e}")
         return
 
     # Create the PDF directory if it doesn't exist, for user convenience
@@ -223,19 +731,26 @@ def run_pdf_processing_pipeline(pdf_files_directory: str, qdrant_collection_name
 
     # Call the main upload function
     upload_pdfs_to_qdrant(
-        client=qdrant_client,
+        client=store,
         pdf_directory=pdf_files_directory,
-        collection_name=qdrant_collection_name
+        collection_name=qdrant_collection_name,
+        encode_batch_size=encode_batch_size,
+        upsert_batch_size=upsert_batch_size,
+        encode_workers=encode_workers,
+        extract_workers=extract_workers,
+        extract_queue_depth=extract_queue_depth,
+        pages_per_task=pages_per_task,
+        incremental=incremental,
+        manifest_path=manifest_path,
+        quantization=quantization,
     )
 
     # You can verify by getting collection info
     try:
-        collection_info = qdrant_client.get_collection(collection_name=qdrant_collection_name)
+        collection_info = store.describe(qdrant_collection_name)
         print(f"\nCollection '{qdrant_collection_name}' info:")
-        print(f"  Status: {collection_info.status}")
-        print(f"  Points count: {collection_info.points_count}")
-        print(f"  Vectors count: {collection_info.vectors_count}")
-        print(f"  Config: {collection_info.config}")
+        for key, value in collection_info.items():
+            print(f"  {key.replace('_', ' ').capitalize()}: {value}")
     except Exception as e:
         print(f"Could not retrieve info for collection '{qdrant_collection_name}': {e}")
 
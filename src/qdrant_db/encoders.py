@@ -0,0 +1,204 @@
+import os
+import numpy as np
+
+# --- Encoder backends ---
+# Ingestion (embed.py) and retrieval (retrieve.py) share one encoder, built by
+# clients.get_encoder(). Both backends produce the same normalized mean-pooled
+# all-MiniLM-L6-v2 embeddings, so a collection can be queried with either.
+#   EMBEDDING_BACKEND: "torch" (sentence-transformers) or "onnx" (ONNX Runtime).
+#   EMBEDDING_ONNX_QUANTIZE: "true" to run an int8 dynamically quantized copy of the ONNX model.
+#   EMBEDDING_THREADS: intra-op threads for either backend (0 = library default).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() in ("1", "true", "yes")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_ONNX_CACHE_DIR = os.getenv("EMBEDDING_ONNX_CACHE_DIR", os.path.join("models", "onnx"))
+EMBEDDING_MAX_SEQ_LENGTH = 256  # Same truncation as the sentence-transformers model config
+
+# Sentences used by `check_parity` when no texts are given
+PARITY_SAMPLE_TEXTS = [
+    "How many letters are in the word strawberry?",
+    "Quantas vezes a letra a aparece em banana?",
+    "The quarterly report shows revenue growth of 12% driven by new customers.",
+    "Qdrant stores dense vectors and supports filtered nearest-neighbour search.",
+    "--- Page 3 ---\nTable 2: results of the ablation study on the validation set.",
+]
+
+
+class Encoder:
+    """
+    Turns texts into embeddings.
+
+    `encode` follows SentenceTransformer.encode: a single string gives a 1-D vector, a
+    list gives a 2-D array with one row per text.
+    """
+
+    name = "encoder"
+    dimension: int
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        raise NotImplementedError
+
+    def start_pool(self, workers: int):
+        """Starts a multi-process encoding pool, or returns None if the backend has none."""
+        return None
+
+    def encode_with_pool(self, texts, pool, batch_size: int = 32) -> np.ndarray:
+        return self.encode(texts, batch_size=batch_size)
+
+    def stop_pool(self, pool):
+        pass
+
+
+class SentenceTransformerEncoder(Encoder):
+    """Full-precision PyTorch encoder (sentence-transformers)."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, threads: int = EMBEDDING_THREADS):
+        # Imported here because importing sentence_transformers (and torch) is slow
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+    def start_pool(self, workers: int):
+        return self.model.start_multi_process_pool(target_devices=["cpu"] * workers)
+
+    def encode_with_pool(self, texts, pool, batch_size: int = 32) -> np.ndarray:
+        return self.model.encode_multi_process(texts, pool, batch_size=batch_size)
+
+    def stop_pool(self, pool):
+        self.model.stop_multi_process_pool(pool)
+
+
+class OnnxEncoder(Encoder):
+    """
+    ONNX Runtime encoder for sentence-transformers models that ship an ONNX export
+    (`onnx/model.onnx` in the model repository, as all-MiniLM-L6-v2 does).
+
+    Runs the transformer with ONNX Runtime and applies the same mean pooling and L2
+    normalization as the sentence-transformers pipeline. With `quantize=True` an int8
+    dynamically quantized copy of the model is built once and cached in `cache_dir`.
+    No torch import is needed, which also keeps start-up time and memory down.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+                 threads: int = EMBEDDING_THREADS, cache_dir: str = EMBEDDING_ONNX_CACHE_DIR):
+        try:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(f"The ONNX encoder backend requires onnxruntime, tokenizers and huggingface-hub: {e}")
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        model_path = hf_hub_download(repo_id, "onnx/model.onnx")
+        if quantize:
+            model_path = self._quantized_copy(model_path, repo_id, cache_dir)
+        self.name = "onnx-int8" if quantize else "onnx"
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    @staticmethod
+    def _quantized_copy(model_path: str, repo_id: str, cache_dir: str) -> str:
+        """Returns the path of the int8 copy of `model_path`, quantizing it on first use."""
+        quantized_path = os.path.join(cache_dir, repo_id.replace("/", "__"), "model_qint8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+            tmp_path = f"{quantized_path}.tmp"
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+            print(f"Quantized ONNX model written to '{quantized_path}'.")
+        return quantized_path
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            embeddings[start:start + len(batch)] = self._encode_batch(batch)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (sentence-transformers' Pooling + Normalize)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+
+def build_encoder(model_name: str, backend: str = EMBEDDING_BACKEND, **kwargs) -> Encoder:
+    """Builds the encoder for `backend` ("torch" or "onnx")."""
+    if backend == "torch":
+        return SentenceTransformerEncoder(model_name, **kwargs)
+    if backend == "onnx":
+        return OnnxEncoder(model_name, **kwargs)
+    raise ValueError(f"Unknown embedding backend '{backend}' (expected 'torch' or 'onnx').")
+
+
+def check_parity(candidate: Encoder, reference: Encoder, texts=None) -> dict:
+    """
+    Compares the embeddings of two encoders on the same texts.
+
+    Args:
+        candidate (Encoder): The encoder under test, e.g. an int8 ONNX encoder.
+        reference (Encoder): The baseline, normally the PyTorch encoder.
+        texts (list[str], optional): Texts to embed. Defaults to PARITY_SAMPLE_TEXTS.
+
+    Returns:
+        dict: Minimum and mean cosine similarity between paired embeddings, and the
+              largest absolute difference of any component.
+    """
+    texts = texts or PARITY_SAMPLE_TEXTS
+    a = np.asarray(candidate.encode(texts), dtype=np.float32)
+    b = np.asarray(reference.encode(texts), dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {
+        "candidate": candidate.name,
+        "reference": reference.name,
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(a - b).max()),
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from .clients import EMBEDDING_MODEL_NAME
+
+    reference = SentenceTransformerEncoder(EMBEDDING_MODEL_NAME)
+    for quantize in (False, True):
+        candidate = OnnxEncoder(EMBEDDING_MODEL_NAME, quantize=quantize)
+        print(check_parity(candidate, reference))
+        for encoder in (reference, candidate):
+            start = time.perf_counter()
+            encoder.encode(PARITY_SAMPLE_TEXTS * 40, batch_size=64)
+            print(f"  {encoder.name}: {time.perf_counter() - start:.3f}s for {len(PARITY_SAMPLE_TEXTS) * 40} texts")
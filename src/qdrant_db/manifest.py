@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import uuid
+
+# Namespace for deterministic point IDs: the same chunk of the same PDF always maps
+# to the same Qdrant point, so re-running the ingestion overwrites instead of duplicating.
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "ai-agents-test/qdrant_db/pdf_chunks")
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text):
+    """Returns the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def point_id(source_pdf, text_hash):
+    """Derives a stable Qdrant point ID from the source PDF name and the chunk hash."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source_pdf}:{text_hash}"))
+
+
+def default_manifest_path(pdf_directory, collection_name):
+    """Location of the manifest when none is configured: next to the PDFs, one per collection."""
+    return os.path.join(pdf_directory, f".ingest_manifest_{collection_name}.json")
+
+
+class IngestionManifest:
+    """
+    Records what has been ingested into a collection, so re-runs can be incremental.
+
+    The manifest is a JSON file of the form:
+        {"version": 1, "collection": "...",
+         "files": {"report.pdf": {"sha256": "<file hash>", "chunks": {"<chunk hash>": <chunk_number>},
+                                  "pending": ["<chunk hash>", ...]}}}
+
+    "pending" lists chunks whose last encode or upsert failed: they stay tracked (their
+    points may exist from an earlier run, and must be deleted if the chunk disappears),
+    but are embedded again on the next run.
+    """
+
+    def __init__(self, path, collection_name, files=None):
+        self.path = path
+        self.collection_name = collection_name
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path, collection_name):
+        """Loads a manifest from disk, returning an empty one if it is missing or unusable."""
+        if not os.path.exists(path):
+            return cls(path, collection_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest '{path}', starting from scratch: {e}")
+            return cls(path, collection_name)
+        if data.get("version") != MANIFEST_VERSION or data.get("collection") != collection_name:
+            print(f"Manifest '{path}' does not match collection '{collection_name}'. Ignoring it.")
+            return cls(path, collection_name)
+        return cls(path, collection_name, data.get("files", {}))
+
+    def save(self):
+        """Writes the manifest atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "collection": self.collection_name, "files": self.files},
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, filename, sha256):
+        entry = self.files.get(filename)
+        return entry is not None and entry.get("sha256") == sha256
+
+    def chunks(self, filename):
+        """Returns {chunk hash: chunk_number} recorded for a file."""
+        return dict(self.files.get(filename, {}).get("chunks", {}))
+
+    def pending(self, filename):
+        """Returns the hashes of a file's chunks that must be embedded again."""
+        return set(self.files.get(filename, {}).get("pending", ()))
+
+    def record(self, filename, sha256, chunks, pending=None):
+        self.files[filename] = {"sha256": sha256, "chunks": chunks}
+        if pending:
+            self.files[filename]["pending"] = sorted(pending)
+
+    def forget(self, filename):
+        self.files.pop(filename, None)
+
+    def point_ids(self, filename):
+        """Returns the point IDs of every chunk recorded for a file."""
+        return [point_id(filename, h) for h in self.files.get(filename, {}).get("chunks", {})]
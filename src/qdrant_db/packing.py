@@ -0,0 +1,104 @@
+# Compact retrieval output for agent context windows.
+#
+# Consecutive chunks of a PDF overlap by CHUNK_OVERLAP words (see embed.py), so hits that
+# are adjacent in the document repeat text. `pack_hits` merges such hits into passages
+# using the word offsets stored in each payload, drops the payload, and keeps the best
+# passages that fit a token budget.
+
+# Rough token estimate for English/Portuguese prose with the Claude tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _passage(hit: dict) -> dict:
+    payload = hit.get("payload") or {}
+    return {
+        "source_pdf": hit["source_pdf"],
+        "chunk_numbers": [hit["chunk_number"]],
+        "page_start": payload.get("page_start"),
+        "page_end": payload.get("page_end"),
+        "score": hit["score"],
+        "text": hit["text"],
+        "_word_start": payload.get("word_start"),
+        "_word_end": payload.get("word_end"),
+    }
+
+
+def merge_hits(hits) -> list:
+    """
+    Merges hits of the same PDF whose word ranges overlap or touch into single passages.
+
+    Hits without word offsets (ingested before offsets were stored) are kept as they are.
+
+    Returns:
+        list[dict]: Passages with 'source_pdf', 'chunk_numbers', 'page_start', 'page_end',
+                    'score' (best of the merged hits) and 'text', best score first.
+    """
+    by_pdf = {}
+    passages = []
+    for hit in hits:
+        passage = _passage(hit)
+        if passage["_word_start"] is None or passage["_word_end"] is None:
+            passages.append(passage)
+        else:
+            by_pdf.setdefault(passage["source_pdf"], []).append(passage)
+
+    for pdf_passages in by_pdf.values():
+        pdf_passages.sort(key=lambda p: p["_word_start"])
+        current = pdf_passages[0]
+        for passage in pdf_passages[1:]:
+            if passage["_word_start"] > current["_word_end"]:
+                passages.append(current)
+                current = passage
+                continue
+            if passage["_word_end"] > current["_word_end"]:
+                # Chunk texts are words joined by single spaces, so the overlap is skipped by word count
+                overlap = current["_word_end"] - passage["_word_start"]
+                new_words = passage["text"].split(" ")[overlap:]
+                current["text"] = " ".join([current["text"], *new_words]) if current["text"] else " ".join(new_words)
+                current["_word_end"] = passage["_word_end"]
+                current["page_end"] = passage["page_end"]
+            current["chunk_numbers"].append(passage["chunk_numbers"][0])
+            current["score"] = max(current["score"], passage["score"])
+        passages.append(current)
+
+    for passage in passages:
+        del passage["_word_start"], passage["_word_end"]
+        passage["chunk_numbers"].sort()
+    passages.sort(key=lambda p: p["score"], reverse=True)
+    return passages
+
+
+def pack_hits(hits, max_tokens: int = None) -> list:
+    """
+    Merges overlapping hits (see `merge_hits`) and keeps the best passages whose
+    estimated token count fits in `max_tokens`.
+
+    A passage that does not fit is skipped in favour of smaller, lower-scored ones. If
+    not even the best passage fits, it is truncated to the budget so the caller always
+    gets something.
+
+    Returns:
+        list[dict]: The packed passages, best score first, each with an 'estimated_tokens' count.
+    """
+    passages = merge_hits(hits)
+    packed = []
+    used = 0
+    for passage in passages:
+        tokens = estimate_tokens(passage["text"])
+        if max_tokens is not None and used + tokens > max_tokens:
+            continue
+        passage["estimated_tokens"] = tokens
+        packed.append(passage)
+        used += tokens
+
+    if not packed and passages and max_tokens:
+        best = passages[0]
+        best["text"] = best["text"][:max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+        best["estimated_tokens"] = estimate_tokens(best["text"])
+        best["truncated"] = True
+        packed.append(best)
+    return packed
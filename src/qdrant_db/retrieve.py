@@ -1,54 +1,190 @@
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from strands import tool
+from .. import metrics
+from . import cache
+from .packing import pack_hits
+from .clients import get_encoder
+from .stores import SearchFilter, get_vector_store
 
 
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_URL = "https://4b6b6bd6-689d-4874-a9ab-f7f2489ee76b.us-east-1-0.aws.cloud.qdrant.io:6333"
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
-EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
-_qdrant_client = None
-_embedding_model = None
 
-def _initialize_global_clients():
-    """Initializes global Qdrant client and embedding model."""
-    global _qdrant_client, _embedding_model
+# The vector store (Qdrant by default, or the local backend, see stores.py) and the
+# embedding model are shared with embed.py and created lazily on the first retrieval.
+# Call clients.warm_up() to pay that cost upfront.
+# Query embeddings and search results are cached in-process (see cache.py).
 
-    if not QDRANT_API_KEY:
-        raise ValueError("QDRANT_API_KEY environment variable not set. Cannot initialize Qdrant client.")
-    if not QDRANT_URL:
-        raise ValueError("QDRANT_URL environment variable not set. Cannot initialize Qdrant client.")
+# Speculative retrievals started by `prefetch` run on this pool. While one is in flight,
+# a tool call for the same query (and top_k / score_threshold) waits for it instead of
+# searching again; once it finishes, its results are in the result cache.
+RETRIEVAL_PREFETCH_WORKERS = int(os.getenv("RETRIEVAL_PREFETCH_WORKERS", "2"))
+_prefetch_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_PREFETCH_WORKERS, thread_name_prefix="retrieval-prefetch")
+_prefetch_lock = threading.Lock()
+_prefetches = {}  # result cache key -> Future
 
+
+def _format_hits(search_results) -> list:
+    """Converts scored points (Qdrant's or the local store's) into the result dictionaries returned by the tools."""
+    results = []
+    for hit in search_results or []:
+        payload = hit.payload
+        results.append({
+            "text": payload.get("text", ""), # The actual text chunk
+            "source_pdf": payload.get("source_pdf", "N/A"),
+            "chunk_number": payload.get("chunk_number", -1),
+            "score": hit.score,
+            "payload": payload # Include the full payload for flexibility
+        })
+    return results
+
+
+def _encode_query(query: str) -> list:
+    """Returns the (cached) embedding of a query."""
+    encoder = get_encoder()
+
+    def encode(q):
+        with metrics.span("query_encode", backend=encoder.name):
+            return encoder.encode(q).tolist()
+
+    return cache.get_query_embedding(query, encode)
+
+
+def _search_filter(source_pdfs=None, min_chunk=None, max_chunk=None):
+    """Builds the SearchFilter of the tools' filter arguments, or None when they are all unset."""
+    if isinstance(source_pdfs, str):
+        source_pdfs = [source_pdfs]
+    query_filter = SearchFilter(source_pdfs=source_pdfs or None, min_chunk=min_chunk, max_chunk=max_chunk)
+    return None if query_filter.is_empty() else query_filter
+
+
+def _result_key(query: str, top_k: int, score_threshold: float, query_filter: SearchFilter = None):
+    if query_filter is None:
+        return cache.result_key(COLLECTION_NAME, query, top_k, score_threshold)
+    return cache.result_key(COLLECTION_NAME, query, top_k, score_threshold, query_filter.cache_key())
+
+
+def _cached_results(query: str, top_k: int, score_threshold: float, query_filter: SearchFilter = None):
+    """Logs the lookup and returns (result cache key, cached results or None)."""
+    print(f"\n🔍 Retrieving documents from '{COLLECTION_NAME}' for query: \"{query}\""
+          f"{f' ({query_filter})' if query_filter else ''}")
+    result_key = _result_key(query, top_k, score_threshold, query_filter)
+    cached_results = cache.get_results(result_key)
+    metrics.count("retrieval_result_cache", result="hit" if cached_results is not None else "miss")
+    if cached_results is not None:
+        print(f"Found {len(cached_results)} relevant chunks (cached).")
+    return result_key, cached_results
+
+
+def _finish(result_key, search_results) -> list:
+    """Formats, logs and caches the results of a search."""
+    results = _format_hits(search_results)
+    if results:
+        print(f"Found {len(results)} relevant chunks.")
+    else:
+        print("No relevant chunks found.")
+
+    cache.put_results(result_key, results)
+    return results
+
+
+def _shape(results: list, compact: bool, max_tokens: int) -> list:
+    """Returns the results as they are, or merged and packed (see packing.py) in compact mode."""
+    if not compact and max_tokens is None:
+        return results
+    return pack_hits(results, max_tokens)
+
+
+def _search(query: str, top_k: int, score_threshold: float, result_key, query_filter: SearchFilter = None) -> list:
+    """Encodes and searches a query that missed the cache, and caches the results."""
+    # 1. Generate embedding for the query
     try:
-        _qdrant_client = QdrantClient(
-            url=QDRANT_URL,
-            api_key=QDRANT_API_KEY
-        )
-        print(f"Global Qdrant client initialized successfully for URL: {QDRANT_URL}")
+        query_embedding = _encode_query(query)
     except Exception as e:
-        raise RuntimeError(f"Failed to initialize global Qdrant client: {e}")
+        print(f"Error generating query embedding: {e}")
+        return []
 
+    # 2. Search the vector store for similar vectors
     try:
-        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-        print(f"Global SentenceTransformer model '{EMBEDDING_MODEL_NAME}' loaded successfully.")
+        with metrics.span("vector_search", mode="sync"):
+            search_results = get_vector_store().search(
+                COLLECTION_NAME,
+                query_embedding,
+                limit=top_k,
+                score_threshold=score_threshold, # Optional: filter by score
+                query_filter=query_filter, # Optional: restrict to some documents / chunks
+            )
     except Exception as e:
-        raise RuntimeError(f"Failed to load global SentenceTransformer model '{EMBEDDING_MODEL_NAME}': {e}")
+        print(f"Error searching the vector store: {e}")
+        return []
+
+    # 3. Process and return results
+    return _finish(result_key, search_results)
+
+
+def prefetch(query: str, top_k: int = 5, score_threshold: float = None) -> Future:
+    """
+    Starts retrieving `query` in the background, e.g. while the orchestrator's first
+    model call is in flight, and returns a Future of the results.
+
+    A later retrieve_relevant_texts call with the same arguments is served from the
+    prefetch (waiting for it if it is still running) instead of searching again.
+    """
+    result_key = _result_key(query, top_k, score_threshold)
+    with _prefetch_lock:
+        future = _prefetches.get(result_key)
+        if future is None:
+            future = _prefetch_executor.submit(_run_prefetch, query, top_k, score_threshold, result_key)
+            _prefetches[result_key] = future
+    return future
+
+
+def _run_prefetch(query: str, top_k: int, score_threshold: float, result_key) -> list:
+    try:
+        with metrics.span("retrieval_prefetch"):
+            results = cache.get_results(result_key)
+            if results is None:
+                results = _search(query, top_k, score_threshold, result_key)
+        return results
+    finally:
+        # The results are cached by now, so later calls hit the cache instead
+        with _prefetch_lock:
+            _prefetches.pop(result_key, None)
+
+
+def _pending_prefetch(result_key):
+    """Returns the Future of an in-flight prefetch for `result_key`, or None if there is none."""
+    with _prefetch_lock:
+        future = _prefetches.get(result_key)
+    if future is not None:
+        metrics.count("retrieval_prefetch_joined")
+        print("Waiting for the prefetched retrieval of this query.")
+    return future
+
+
+def get_cache_stats() -> dict:
+    """Returns the hit/miss counters of the query-embedding and search-result caches."""
+    return cache.get_cache_stats()
+
 
-# Call initialization when the module is loaded.
-# Consider implications if this script is part of a larger app (e.g., avoid re-initialization if not needed)
-_initialize_global_clients()
-    
 @tool
+@metrics.traced_tool
 def retrieve_relevant_texts(
     query: str,
     top_k: int = 5,
-    score_threshold: float = None
+    score_threshold: float = None,
+    compact: bool = False,
+    max_tokens: int = None,
+    source_pdfs: list = None,
+    min_chunk: int = None,
+    max_chunk: int = None
 ) -> list:
     """
-    Retrieves the most relevant text chunks from a Qdrant vector database
-    based on the given text query. Uses globally configured Qdrant client,
-    collection name, and sentence transformer model.
+    Retrieves the most relevant text chunks from the vector database (Qdrant by default)
+    based on the given text query. Uses globally configured vector store,
+    collection name, and shared encoder. Repeated queries are
+    served from an in-process cache.
 
     Args:
         query (str): The user query to search in the knowledge base.
@@ -57,6 +193,14 @@ def retrieve_relevant_texts(
                                          equal to or above this threshold will be returned.
                                          Qdrant COSINE scores are between -1 and 1 (higher is better).
                                          For 'all-MiniLM-L6-v2', typical good scores are > 0.6 or 0.7.
+        compact (bool): Merge overlapping or adjacent chunks of the same PDF into passages
+                        and leave out the payload. Uses far fewer tokens; prefer it.
+        max_tokens (int, optional): Return only the best passages that fit in about this many
+                                    tokens. Implies compact.
+        source_pdfs (list[str], optional): Only search chunks of these PDF files, e.g. when the
+                                           question is about a specific document.
+        min_chunk (int, optional): Only search chunks with chunk_number >= min_chunk.
+        max_chunk (int, optional): Only search chunks with chunk_number <= max_chunk.
 
     Returns:
         list[dict]: A list of dictionaries, where each dictionary contains:
@@ -65,66 +209,141 @@ def retrieve_relevant_texts(
             - 'chunk_number': The number of the chunk within the PDF.
             - 'score': The similarity score of the chunk to the query.
             - 'payload': The full payload if you need other metadata.
+        In compact mode, passages with 'text', 'source_pdf', 'chunk_numbers', 'page_start',
+        'page_end', 'score' and 'estimated_tokens' instead.
     """
-    global _qdrant_client, _embedding_model # Access global instances
+    query_filter = _search_filter(source_pdfs, min_chunk, max_chunk)
+    result_key, cached_results = _cached_results(query, top_k, score_threshold, query_filter)
+    prefetched = _pending_prefetch(result_key) if cached_results is None else None
+    if prefetched is not None:
+        cached_results = [dict(hit) for hit in prefetched.result()]
+    if cached_results is not None:
+        return _shape(cached_results, compact, max_tokens)
 
-    if _qdrant_client is None or _embedding_model is None:
-        raise RuntimeError("Qdrant client or embedding model not initialized. Call _initialize_global_clients().")
+    return _shape(_search(query, top_k, score_threshold, result_key, query_filter), compact, max_tokens)
 
-    print(f"\n🔍 Retrieving documents from '{COLLECTION_NAME}' for query: \"{query}\"")
 
-    # 1. Generate embedding for the query
-    try:
-        query_embedding = _embedding_model.encode(query).tolist()
-    except Exception as e:
-        print(f"Error generating query embedding: {e}")
-        return []
+@tool
+@metrics.traced_tool
+def retrieve_many(
+    queries: list,
+    top_k: int = 5,
+    score_threshold: float = None,
+    source_pdfs: list = None,
+    min_chunk: int = None,
+    max_chunk: int = None
+) -> list:
+    """
+    Retrieves relevant text chunks for several queries at once, e.g. the parts of a
+    decomposed question. All queries are encoded in a single batch and searched with a
+    single batch search request. Prefer this over calling retrieve_relevant_texts repeatedly.
 
-    # 2. Search Qdrant for similar vectors
-    try:
-        search_results = _qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_embedding,
-            limit=top_k,
-            with_payload=True,  # To retrieve the metadata and original text
-            score_threshold=score_threshold # Optional: filter by score
-        )
-    except Exception as e:
-        print(f"Error searching Qdrant: {e}")
+    Args:
+        queries (list[str]): The queries to search in the knowledge base.
+        top_k (int): The maximum number of relevant documents to retrieve per query.
+        score_threshold (float, optional): If set, only results with a score
+                                         equal to or above this threshold will be returned.
+        source_pdfs (list[str], optional): Only search chunks of these PDF files.
+        min_chunk (int, optional): Only search chunks with chunk_number >= min_chunk.
+        max_chunk (int, optional): Only search chunks with chunk_number <= max_chunk.
+
+    Returns:
+        list[dict]: One entry per query, in order, with:
+            - 'query': The query.
+            - 'results': Its hits, in the same format as retrieve_relevant_texts.
+              A chunk matched by several queries is listed only once, under the query
+              where it scored highest, with 'matched_queries' naming all of them.
+    """
+    queries = [query for query in queries if query and query.strip()]
+    if not queries:
         return []
 
-    # 3. Process and return results
-    results = []
-    if search_results:
-        for hit in search_results:
-            payload = hit.payload
-            results.append({
-                "text": payload.get("text", ""), # The actual text chunk
-                "source_pdf": payload.get("source_pdf", "N/A"),
-                "chunk_number": payload.get("chunk_number", -1),
-                "score": hit.score,
-                "payload": payload # Include the full payload for flexibility
-            })
-        print(f"Found {len(results)} relevant chunks.")
-    else:
-        print("No relevant chunks found.")
+    print(f"\n🔍 Retrieving documents from '{COLLECTION_NAME}' for {len(queries)} queries")
 
-    return results
+    query_filter = _search_filter(source_pdfs, min_chunk, max_chunk)
+    result_keys = [_result_key(query, top_k, score_threshold, query_filter) for query in queries]
+    per_query_results = [cache.get_results(key) for key in result_keys]
+    missing = [i for i, results in enumerate(per_query_results) if results is None]
+    metrics.count("retrieval_result_cache", len(queries) - len(missing), result="hit")
+    metrics.count("retrieval_result_cache", len(missing), result="miss")
+
+    if missing:
+        store = get_vector_store()
+        encoder = get_encoder()
+
+        def encode_batch(batch):
+            with metrics.span("query_encode", backend=encoder.name, batch=True) as span:
+                span.set(queries=len(batch))
+                return encoder.encode(batch).tolist()
+
+        # 1. Generate embeddings for all uncached queries in one forward pass
+        try:
+            query_embeddings = cache.get_query_embeddings(
+                [queries[i] for i in missing],
+                encode_batch,
+            )
+        except Exception as e:
+            print(f"Error generating query embeddings: {e}")
+            return []
+
+        # 2. Search for all of them in one request
+        try:
+            with metrics.span("vector_search", mode="batch") as span:
+                span.set(queries=len(query_embeddings))
+                batch_results = store.search_batch(
+                    COLLECTION_NAME,
+                    query_embeddings,
+                    limit=top_k,
+                    score_threshold=score_threshold,
+                    query_filter=query_filter,
+                )
+        except Exception as e:
+            print(f"Error searching the vector store: {e}")
+            return []
+
+        for i, search_results in zip(missing, batch_results):
+            per_query_results[i] = _format_hits(search_results)
+            cache.put_results(result_keys[i], per_query_results[i])
+
+    # 3. Deduplicate across queries: keep each chunk under its best-scoring query
+    best = {}  # (source_pdf, chunk_number) -> (score, query index)
+    matched_queries = {}
+    for i, results in enumerate(per_query_results):
+        for hit in results:
+            chunk_key = (hit["source_pdf"], hit["chunk_number"])
+            matched_queries.setdefault(chunk_key, []).append(queries[i])
+            if chunk_key not in best or hit["score"] > best[chunk_key][0]:
+                best[chunk_key] = (hit["score"], i)
+
+    grouped = []
+    for i, results in enumerate(per_query_results):
+        hits = []
+        for hit in results:
+            chunk_key = (hit["source_pdf"], hit["chunk_number"])
+            if best[chunk_key][1] != i:
+                continue
+            best[chunk_key] = (best[chunk_key][0], None)  # Emit duplicates within one query once
+            if len(matched_queries[chunk_key]) > 1:
+                hit["matched_queries"] = list(dict.fromkeys(matched_queries[chunk_key]))
+            hits.append(hit)
+        grouped.append({"query": queries[i], "results": hits})
+
+    print(f"Found {len(best)} distinct relevant chunks.")
+    return grouped
 
 if __name__ == '__main__':
     # This is an example of how to use it.
     # Ensure QDRANT_API_KEY is set as an environment variable before running.
     # Also, ensure your Qdrant instance at QDRANT_URL has the COLLECTION_NAME populated.
     print("Starting example usage of retrieve_relevant_texts...")
-    if not QDRANT_API_KEY:
+    if not os.getenv("QDRANT_API_KEY"):
         print("Error: QDRANT_API_KEY environment variable is not set.")
         print("Please set it before running this example.")
         print("Example: export QDRANT_API_KEY='your_api_key_here'")
     else:
         try:
-            # The clients are initialized when the module loads.
-            # If you needed to re-initialize or ensure initialization:
-            # _initialize_global_clients() # Though it's called above already.
+            # The clients are initialized on the first call.
+            # To load them upfront instead: clients.warm_up()
 
             sample_query = "What is the main theme of the cosmos?"
             retrieved_docs = retrieve_relevant_texts(query=sample_query, top_k=3)
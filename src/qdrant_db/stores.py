@@ -0,0 +1,710 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+import numpy as np
+from qdrant_client import QdrantClient, models
+from .clients import get_qdrant_client
+
+# --- Vector store backend selection ---
+# "qdrant" (default) uses the shared Qdrant client; "local" keeps the vectors in
+# memory-mapped NumPy files under LOCAL_VECTOR_STORE_DIR, with no network round trip.
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+LOCAL_VECTOR_STORE_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", "vector_store")
+LOCAL_VECTOR_STORE_DTYPE = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")  # or "float16"
+
+# Rows scored per matrix product in the local backend; bounds temporary memory.
+LOCAL_SEARCH_BLOCK_ROWS = 65536
+
+# --- Qdrant collection and search tuning ---
+# QDRANT_QUANTIZATION: "none", "scalar" (int8, ~4x smaller) or "binary" (~32x smaller).
+# Quantized vectors are kept in RAM and the original float32 vectors on disk.
+# Searches on quantized collections (whatever quantization they were created with)
+# oversample candidates and rescore them with the original vectors, which keeps recall
+# close to the unquantized search.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0")) or None
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() in ("1", "true", "yes")
+
+
+@dataclass
+class SearchTuning:
+    """
+    Search-time parameters for Qdrant.
+
+    Attributes:
+        hnsw_ef (int, optional): Size of the HNSW candidate list; higher is more accurate and slower.
+        exact (bool): Bypass the index and search exhaustively.
+        oversampling (float, optional): For quantized collections, fetch `limit * oversampling`
+                                        candidates with the quantized vectors before rescoring.
+        rescore (bool, optional): For quantized collections, rescore candidates with the original vectors.
+    """
+    hnsw_ef: int = None
+    exact: bool = False
+    oversampling: float = None
+    rescore: bool = None
+
+    def to_qdrant(self):
+        quantization = None
+        if self.oversampling is not None or self.rescore is not None:
+            quantization = models.QuantizationSearchParams(
+                ignore=False,
+                rescore=self.rescore,
+                oversampling=self.oversampling,
+            )
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, exact=self.exact, quantization=quantization)
+
+
+def default_search_tuning(quantized: bool = None) -> SearchTuning:
+    """
+    SearchTuning built from the QDRANT_SEARCH_* environment variables, for a quantized
+    collection or not. `quantized` defaults to whether QDRANT_QUANTIZATION is set.
+    """
+    if quantized is None:
+        quantized = QDRANT_QUANTIZATION != "none"
+    return SearchTuning(
+        hnsw_ef=QDRANT_SEARCH_HNSW_EF,
+        oversampling=QDRANT_SEARCH_OVERSAMPLING if quantized else None,
+        rescore=QDRANT_SEARCH_RESCORE if quantized else None,
+    )
+
+
+def quantization_config(quantization: str):
+    """Returns the Qdrant quantization config for "scalar" or "binary", or None for "none"."""
+    if quantization in (None, "none"):
+        return None
+    if quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown quantization '{quantization}' (expected 'none', 'scalar' or 'binary').")
+
+
+@dataclass
+class SearchFilter:
+    """
+    Restricts a search to some documents and/or a range of chunks. Applied by Qdrant
+    during the HNSW search, using the payload indexes created by `ensure_collection`.
+
+    Attributes:
+        source_pdfs (list[str], optional): Only chunks of these PDFs.
+        min_chunk (int, optional): Only chunks with chunk_number >= min_chunk.
+        max_chunk (int, optional): Only chunks with chunk_number <= max_chunk.
+    """
+    source_pdfs: list = None
+    min_chunk: int = None
+    max_chunk: int = None
+
+    def is_empty(self) -> bool:
+        return not self.source_pdfs and self.min_chunk is None and self.max_chunk is None
+
+    def cache_key(self) -> tuple:
+        return (tuple(sorted(self.source_pdfs or ())), self.min_chunk, self.max_chunk)
+
+    def to_qdrant(self):
+        if self.is_empty():
+            return None
+        conditions = []
+        if self.source_pdfs:
+            conditions.append(models.FieldCondition(key="source_pdf", match=models.MatchAny(any=list(self.source_pdfs))))
+        if self.min_chunk is not None or self.max_chunk is not None:
+            conditions.append(models.FieldCondition(
+                key="chunk_number", range=models.Range(gte=self.min_chunk, lte=self.max_chunk)
+            ))
+        return models.Filter(must=conditions)
+
+
+def _qdrant_filter(query_filter):
+    return query_filter.to_qdrant() if query_filter is not None else None
+
+
+@dataclass
+class SearchHit:
+    """A search result. Mirrors the attributes of Qdrant's ScoredPoint used by the tools."""
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+
+
+class VectorStore:
+    """
+    Interface shared by the ingestion pipeline and the retrieval tools.
+
+    Vectors are passed as NumPy arrays (one row per point); point IDs are strings.
+    """
+
+    def ensure_collection(self, collection_name: str, dimension: int, quantization: str = None):
+        """Creates the collection if it does not exist yet. `quantization` is a backend hint."""
+        raise NotImplementedError
+
+    def upsert(self, collection_name: str, ids, vectors, payloads):
+        """Inserts or replaces points."""
+        raise NotImplementedError
+
+    def set_payload(self, collection_name: str, updates):
+        """Merges payload fields into existing points. `updates` is a list of (id, payload)."""
+        raise NotImplementedError
+
+    def delete(self, collection_name: str, ids):
+        """Deletes points by ID."""
+        raise NotImplementedError
+
+    def search(self, collection_name: str, vector, limit: int, score_threshold: float = None,
+               tuning: SearchTuning = None, query_filter: SearchFilter = None):
+        """Returns up to `limit` SearchHit-like objects, best first, optionally restricted by `query_filter`."""
+        return self.search_batch(collection_name, [vector], limit, score_threshold, tuning, query_filter)[0]
+
+    def search_batch(self, collection_name: str, vectors, limit: int, score_threshold: float = None,
+                     tuning: SearchTuning = None, query_filter: SearchFilter = None):
+        """Runs one search per vector and returns the lists of hits, in order."""
+        raise NotImplementedError
+
+    def describe(self, collection_name: str) -> dict:
+        """Returns a few facts about the collection, for logging."""
+        raise NotImplementedError
+
+    def revision(self, collection_name: str):
+        """
+        Returns a value that changes when the collection is written to, by this or any
+        other process. The default is the number of points, which misses writes that
+        replace points without changing their count.
+        """
+        return self.describe(collection_name).get("points_count")
+
+
+class QdrantStore(VectorStore):
+    """
+    VectorStore backed by a Qdrant server (or Qdrant's local/in-memory mode).
+
+    `quantization` is used when creating collections and `search_tuning` for searches
+    that do not pass one. Without `search_tuning`, the default tuning of each collection
+    depends on whether the collection is actually quantized.
+    """
+
+    # Payload fields indexed on every collection, so filtered searches do not scan
+    PAYLOAD_INDEXES = {
+        "source_pdf": models.PayloadSchemaType.KEYWORD,
+        "chunk_number": models.PayloadSchemaType.INTEGER,
+    }
+
+    def __init__(self, client: QdrantClient, quantization: str = QDRANT_QUANTIZATION,
+                 search_tuning: SearchTuning = None):
+        self.client = client
+        self.quantization = quantization
+        self.search_tuning = search_tuning
+        self._collection_tunings = {}  # collection name -> default SearchTuning
+        self._tunings_lock = threading.Lock()
+
+    def _search_tuning(self, collection_name: str, tuning: SearchTuning = None) -> SearchTuning:
+        """Returns `tuning`, else the store's, else the default for the collection's quantization."""
+        if tuning is not None or self.search_tuning is not None:
+            return tuning or self.search_tuning
+        with self._tunings_lock:
+            collection_tuning = self._collection_tunings.get(collection_name)
+        if collection_tuning is None:
+            try:
+                info = self.client.get_collection(collection_name=collection_name)
+            except Exception as e:
+                print(f"Could not read the quantization of '{collection_name}': {e}")
+                return default_search_tuning()
+            collection_tuning = default_search_tuning(info.config.quantization_config is not None)
+            with self._tunings_lock:
+                self._collection_tunings[collection_name] = collection_tuning
+        return collection_tuning
+
+    def ensure_collection(self, collection_name: str, dimension: int, quantization: str = None):
+        quantization = quantization or self.quantization
+        quantization_settings = quantization_config(quantization)
+        collection_names = [c.name for c in self.client.get_collections().collections]
+        if collection_name in collection_names:
+            print(f"Using existing collection '{collection_name}'.")
+            info = self.client.get_collection(collection_name=collection_name)
+            self._ensure_payload_indexes(collection_name, info.payload_schema or {})
+            if quantization_settings is not None:
+                if info.config.quantization_config is None:
+                    print(f"Enabling {quantization} quantization on '{collection_name}'...")
+                    self.client.update_collection(
+                        collection_name=collection_name,
+                        vectors_config={"": models.VectorParamsDiff(on_disk=True)},
+                        quantization_config=quantization_settings,
+                    )
+                    with self._tunings_lock:
+                        self._collection_tunings.pop(collection_name, None)
+            return
+        print(f"Collection '{collection_name}' not found. Creating it...")
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(
+                size=dimension,
+                distance=models.Distance.COSINE,
+                # With quantization, searches run on the in-RAM quantized copy and only
+                # rescoring reads the original vectors
+                on_disk=quantization_settings is not None,
+            ),
+            quantization_config=quantization_settings,
+        )
+        self._ensure_payload_indexes(collection_name, {})
+        with self._tunings_lock:
+            self._collection_tunings.pop(collection_name, None)
+        print(f"Collection '{collection_name}' created successfully"
+              f"{f' with {quantization} quantization' if quantization_settings else ''}.")
+
+    def _ensure_payload_indexes(self, collection_name: str, payload_schema: dict):
+        for field_name, field_schema in self.PAYLOAD_INDEXES.items():
+            if field_name in payload_schema:
+                continue
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
+            print(f"Created {field_schema.value} payload index on '{field_name}' in '{collection_name}'.")
+
+    def upsert(self, collection_name: str, ids, vectors, payloads):
+        self.client.upsert(
+            collection_name=collection_name,
+            points=[
+                models.PointStruct(id=point_id, vector=np.asarray(vector).tolist(), payload=payload)
+                for point_id, vector, payload in zip(ids, vectors, payloads)
+            ],
+            wait=True,
+        )
+
+    def set_payload(self, collection_name: str, updates):
+        self.client.batch_update_points(
+            collection_name=collection_name,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in updates
+            ],
+        )
+
+    def delete(self, collection_name: str, ids):
+        self.client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=list(ids)),
+        )
+
+    def search(self, collection_name: str, vector, limit: int, score_threshold: float = None,
+               tuning: SearchTuning = None, query_filter: SearchFilter = None):
+        return self.client.search(
+            collection_name=collection_name,
+            query_vector=np.asarray(vector).tolist(),
+            limit=limit,
+            with_payload=True,  # To retrieve the metadata and original text
+            score_threshold=score_threshold, # Optional: filter by score
+            search_params=self._search_tuning(collection_name, tuning).to_qdrant(),
+            query_filter=_qdrant_filter(query_filter),
+        )
+
+    def search_batch(self, collection_name: str, vectors, limit: int, score_threshold: float = None,
+                     tuning: SearchTuning = None, query_filter: SearchFilter = None):
+        search_params = self._search_tuning(collection_name, tuning).to_qdrant()
+        qdrant_filter = _qdrant_filter(query_filter)
+        return self.client.search_batch(
+            collection_name=collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=np.asarray(vector).tolist(),
+                    limit=limit,
+                    with_payload=True,
+                    score_threshold=score_threshold,
+                    params=search_params,
+                    filter=qdrant_filter,
+                )
+                for vector in vectors
+            ],
+        )
+
+    def describe(self, collection_name: str) -> dict:
+        info = self.client.get_collection(collection_name=collection_name)
+        return {
+            "status": info.status,
+            "points_count": info.points_count,
+            "vectors_count": info.vectors_count,
+            "config": info.config,
+        }
+
+
+class _LocalCollection:
+    """
+    One collection of the local backend, stored in its own directory:
+        meta.json       - dimension and dtype
+        vectors.bin     - normalized vectors, one row per point slot (memory-mapped for search)
+        payloads.jsonl  - append-only log of {"op": "put", "id", "row", "payload"} / {"op": "delete", "id"}
+    Replacing a point overwrites its row in place; deleting it frees the row, which is
+    masked out of searches and reused by the next new point. The payload log is replayed
+    when the collection is opened, and its new entries are applied before every search
+    and write, so a long-running reader follows the writes of another process (e.g. an
+    ingestion run) instead of mapping a reused row to the point that used to be there.
+    One process should write at a time.
+
+    Searches never look at payload dicts: a boolean live-row mask and per-row arrays of
+    the filterable fields (source_pdf codes, chunk numbers) are kept up to date by the
+    writes, so masks are built with NumPy.
+    """
+
+    def __init__(self, path: str, dimension: int, dtype: str):
+        self.path = path
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._log_path = os.path.join(path, "payloads.jsonl")
+        self._rows = {}  # point id -> row
+        self._ids = []  # row -> point id (None for free rows)
+        self._payloads = {}  # point id -> payload
+        self._free_rows = []  # Rows of deleted points, reused by upserts
+        self._source_pdf_codes = {}  # source_pdf -> code used in _row_sources
+        # Per-row arrays (capacity may exceed len(self._ids))
+        self._live = np.zeros(0, dtype=bool)
+        self._row_sources = np.zeros(0, dtype=np.int32)  # -1 without a source_pdf
+        self._row_chunks = np.zeros(0, dtype=np.float64)  # NaN without a chunk_number
+        self._matrix = None  # Memory map, refreshed after writes
+        self._log_offset = 0  # Bytes of the payload log applied so far
+        self._sync()
+
+    @classmethod
+    def open(cls, path: str, dimension: int = None, dtype: str = LOCAL_VECTOR_STORE_DTYPE):
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return cls(path, meta["dimension"], meta["dtype"])
+        if dimension is None:
+            return None
+        os.makedirs(path, exist_ok=True)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"dimension": dimension, "dtype": np.dtype(dtype).name}, f)
+        return cls(path, dimension, dtype)
+
+    def _row_count(self) -> int:
+        if not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self.dimension * self.dtype.itemsize)
+
+    def _grow(self, row_count: int):
+        """Extends the row list and per-row arrays to `row_count` rows, doubling the arrays' capacity."""
+        self._ids.extend([None] * (row_count - len(self._ids)))
+        if row_count <= len(self._live):
+            return
+        capacity = max(row_count, 2 * len(self._live), 1024)
+        extra = capacity - len(self._live)
+        self._live = np.concatenate([self._live, np.zeros(extra, dtype=bool)])
+        self._row_sources = np.concatenate([self._row_sources, np.full(extra, -1, dtype=np.int32)])
+        self._row_chunks = np.concatenate([self._row_chunks, np.full(extra, np.nan)])
+
+    def _index_row(self, row: int, point_id, payload: dict):
+        """Marks a row live and records its filterable payload fields."""
+        self._ids[row] = point_id
+        self._live[row] = True
+        source_pdf = payload.get("source_pdf")
+        if source_pdf is None:
+            self._row_sources[row] = -1
+        else:
+            self._row_sources[row] = self._source_pdf_codes.setdefault(source_pdf, len(self._source_pdf_codes))
+        chunk_number = payload.get("chunk_number")
+        self._row_chunks[row] = chunk_number if isinstance(chunk_number, (int, float)) else np.nan
+
+    def _free_row(self, row: int):
+        self._ids[row] = None
+        self._live[row] = False
+        self._row_sources[row] = -1
+        self._row_chunks[row] = np.nan
+        self._free_rows.append(row)
+
+    def _sync(self):
+        """
+        Applies the log entries written since the last sync, including those of other
+        processes (e.g. an ingestion run next to a long-running reader). Cheap when the
+        log has not grown: one stat call. Call with `lock` held.
+        """
+        try:
+            log_size = os.path.getsize(self._log_path)
+        except OSError:
+            log_size = 0
+        row_count = self._row_count()
+        if log_size == self._log_offset and row_count == len(self._ids):
+            return
+        if row_count != len(self._ids):
+            self._grow(row_count)
+            self._matrix = None
+        if log_size <= self._log_offset:
+            return
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(log_size - self._log_offset)
+        complete = data.rfind(b"\n") + 1  # A torn last line is applied once it is complete
+        for line in data[:complete].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn line left by a crash
+            self._apply_entry(entry)
+        self._log_offset += complete
+        self._free_rows = np.flatnonzero(~self._live[:len(self._ids)]).tolist()
+
+    def _apply_entry(self, entry: dict):
+        point_id = entry["id"]
+        if entry["op"] == "put" and entry["row"] < len(self._ids):
+            row = entry["row"]
+            previous_row = self._rows.get(point_id)
+            if previous_row is not None and previous_row != row:
+                self._free_row(previous_row)
+            previous_id = self._ids[row]
+            if previous_id is not None and previous_id != point_id:
+                self._rows.pop(previous_id, None)  # The row was reused by another process
+                self._payloads.pop(previous_id, None)
+            self._rows[point_id] = row
+            self._payloads[point_id] = entry["payload"]
+            self._index_row(row, point_id, entry["payload"])
+        elif entry["op"] == "delete" and point_id in self._rows:
+            self._free_row(self._rows.pop(point_id))
+            self._payloads.pop(point_id, None)
+
+    def _normalize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = self._normalize(vectors).astype(self.dtype)
+        last_index = {point_id: i for i, point_id in enumerate(ids)}
+        if len(last_index) != len(ids):
+            # Repeated IDs in one batch: the last occurrence wins, as in Qdrant
+            keep = sorted(last_index.values())
+            ids, vectors, payloads = [ids[i] for i in keep], vectors[keep], [payloads[i] for i in keep]
+        with self.lock:
+            self._sync()
+            log_entries = []
+            appended = []
+            row_bytes = self.dimension * self.dtype.itemsize
+            with open(self._vectors_path, "r+b" if os.path.exists(self._vectors_path) else "wb") as f:
+                for point_id, vector, payload in zip(ids, vectors, payloads):
+                    row = self._rows.get(point_id)
+                    if row is None and self._free_rows:
+                        row = self._free_rows.pop()
+                    if row is None:
+                        row = len(self._ids) + len(appended)
+                        appended.append(vector)
+                    else:
+                        f.seek(row * row_bytes)
+                        f.write(vector.tobytes())
+                    self._rows[point_id] = row
+                    self._payloads[point_id] = payload
+                    log_entries.append({"op": "put", "id": point_id, "row": row, "payload": payload})
+                if appended:
+                    f.seek(len(self._ids) * row_bytes)
+                    f.write(np.stack(appended).tobytes())
+            self._grow(len(self._ids) + len(appended))
+            for point_id, payload in zip(ids, payloads):
+                self._index_row(self._rows[point_id], point_id, payload)
+            self._append_log(log_entries)
+            self._matrix = None
+
+    def set_payload(self, updates):
+        with self.lock:
+            self._sync()
+            log_entries = []
+            for point_id, payload in updates:
+                if point_id not in self._rows:
+                    continue
+                merged = {**self._payloads[point_id], **payload}
+                self._payloads[point_id] = merged
+                self._index_row(self._rows[point_id], point_id, merged)
+                log_entries.append({"op": "put", "id": point_id, "row": self._rows[point_id], "payload": merged})
+            self._append_log(log_entries)
+
+    def delete(self, ids):
+        with self.lock:
+            self._sync()
+            log_entries = []
+            for point_id in ids:
+                row = self._rows.pop(point_id, None)
+                if row is None:
+                    continue
+                self._free_row(row)
+                self._payloads.pop(point_id, None)
+                log_entries.append({"op": "delete", "id": point_id})
+            self._append_log(log_entries)
+
+    def _append_log(self, entries):
+        if not entries:
+            return
+        with open(self._log_path, "ab") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8"))
+            self._log_offset = f.tell()
+
+    def _row_mask(self, row_count: int, query_filter):
+        """Returns a boolean mask of the rows a search may return. Call with `lock` held."""
+        mask = self._live[:row_count].copy()
+        if query_filter is None or query_filter.is_empty():
+            return mask
+        if query_filter.source_pdfs:
+            codes = [self._source_pdf_codes[s] for s in query_filter.source_pdfs if s in self._source_pdf_codes]
+            mask &= np.isin(self._row_sources[:row_count], codes)
+        # Comparisons with NaN are False, so chunks without a chunk_number fail any chunk range
+        if query_filter.min_chunk is not None:
+            mask &= self._row_chunks[:row_count] >= query_filter.min_chunk
+        if query_filter.max_chunk is not None:
+            mask &= self._row_chunks[:row_count] <= query_filter.max_chunk
+        return mask
+
+    def search_batch(self, vectors, limit: int, score_threshold: float = None, query_filter=None):
+        queries = self._normalize(vectors).T  # (dimension, n_queries)
+        with self.lock:
+            self._sync()
+            if self._matrix is None and self._ids:
+                self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                         shape=(len(self._ids), self.dimension))
+            matrix = self._matrix
+            if matrix is not None:
+                mask = self._row_mask(matrix.shape[0], query_filter)
+        if matrix is None or limit <= 0:
+            return [[] for _ in range(queries.shape[1])]
+
+        selected = int(np.count_nonzero(mask))
+        row_count = matrix.shape[0]
+        if selected == 0:
+            return [[] for _ in range(queries.shape[1])]
+        if selected < row_count // 2:
+            # Selective filter (or many free rows): score only the candidate rows
+            rows = np.flatnonzero(mask)
+        else:
+            rows = None
+
+        # Vectorized scoring in blocks; float16 blocks are upcast so the product uses BLAS
+        scored = row_count if rows is None else len(rows)
+        scores = np.empty((scored, queries.shape[1]), dtype=np.float32)
+        for start in range(0, scored, LOCAL_SEARCH_BLOCK_ROWS):
+            if rows is None:
+                block = matrix[start:start + LOCAL_SEARCH_BLOCK_ROWS]
+            else:
+                block = matrix[rows[start:start + LOCAL_SEARCH_BLOCK_ROWS]]
+            block = np.asarray(block, dtype=np.float32)
+            scores[start:start + len(block)] = block @ queries
+        if rows is None and selected < row_count:
+            scores[~mask] = -np.inf
+
+        k = min(limit, selected, scored)
+        tops = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k] if k < scored else np.arange(scored)
+            top = top[np.argsort(-column[top])]
+            tops.append([(int(index if rows is None else rows[index]), float(column[index])) for index in top])
+
+        results = []
+        with self.lock:
+            for top in tops:
+                hits = []
+                for row, score in top:
+                    point_id = self._ids[row] if row < len(self._ids) else None
+                    if point_id is None or score == -np.inf or (score_threshold is not None and score < score_threshold):
+                        continue  # Masked out, or deleted while scoring
+                    hits.append(SearchHit(id=point_id, score=score, payload=self._payloads.get(point_id, {})))
+                results.append(hits)
+        return results
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def revision(self) -> int:
+        """The size of the applied payload log, which grows with every write."""
+        with self.lock:
+            self._sync()
+            return self._log_offset
+
+
+class LocalStore(VectorStore):
+    """
+    In-process VectorStore: normalized embeddings in a memory-mapped NumPy matrix per
+    collection, payloads in a sidecar log, and a vectorized exact top-k search.
+    Suited for corpora up to a few hundred thousand chunks and for offline tests.
+    """
+
+    def __init__(self, root_dir: str = LOCAL_VECTOR_STORE_DIR, dtype: str = LOCAL_VECTOR_STORE_DTYPE):
+        self.root_dir = root_dir
+        self.dtype = dtype
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, collection_name: str, dimension: int = None) -> _LocalCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = _LocalCollection.open(
+                    os.path.join(self.root_dir, collection_name), dimension, self.dtype
+                )
+                if collection is None:
+                    raise ValueError(f"Collection '{collection_name}' does not exist in '{self.root_dir}'.")
+                self._collections[collection_name] = collection
+            return collection
+
+    def ensure_collection(self, collection_name: str, dimension: int, quantization: str = None):
+        # Quantization does not apply: float16 storage (LOCAL_VECTOR_STORE_DTYPE) is the local equivalent
+        collection = self._collection(collection_name, dimension)
+        if collection.dimension != dimension:
+            raise ValueError(f"Collection '{collection_name}' has dimension {collection.dimension}, not {dimension}.")
+        print(f"Using local collection '{collection_name}' in '{self.root_dir}'.")
+
+    def upsert(self, collection_name: str, ids, vectors, payloads):
+        self._collection(collection_name).upsert(list(ids), vectors, list(payloads))
+
+    def set_payload(self, collection_name: str, updates):
+        self._collection(collection_name).set_payload(updates)
+
+    def delete(self, collection_name: str, ids):
+        self._collection(collection_name).delete(ids)
+
+    def search_batch(self, collection_name: str, vectors, limit: int, score_threshold: float = None,
+                     tuning: SearchTuning = None, query_filter: SearchFilter = None):
+        # The local search is exact, so there is nothing to tune
+        return self._collection(collection_name).search_batch(vectors, limit, score_threshold, query_filter)
+
+    def revision(self, collection_name: str) -> int:
+        return self._collection(collection_name).revision()
+
+    def describe(self, collection_name: str) -> dict:
+        collection = self._collection(collection_name)
+        return {
+            "status": "local",
+            "points_count": collection.count(),
+            "config": {"path": collection.path, "dimension": collection.dimension, "dtype": collection.dtype.name},
+        }
+
+
+_store_lock = threading.Lock()
+_vector_store = None
+
+
+def get_vector_store() -> VectorStore:
+    """Returns the shared vector store selected by VECTOR_STORE_BACKEND, creating it on first use."""
+    global _vector_store
+    with _store_lock:
+        if _vector_store is None:
+            if VECTOR_STORE_BACKEND == "local":
+                _vector_store = LocalStore()
+            elif VECTOR_STORE_BACKEND == "qdrant":
+                _vector_store = QdrantStore(get_qdrant_client())
+            else:
+                raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{VECTOR_STORE_BACKEND}' (expected 'qdrant' or 'local').")
+    return _vector_store
+
+
+def set_vector_store(store: VectorStore):
+    """Replaces the shared vector store, e.g. with a LocalStore in tests."""
+    global _vector_store
+    with _store_lock:
+        _vector_store = store
+
+
+def as_vector_store(client) -> VectorStore:
+    """Accepts either a VectorStore or a QdrantClient and returns a VectorStore."""
+    if isinstance(client, VectorStore):
+        return client
+    return QdrantStore(client)
@@ -0,0 +1,306 @@
+"""
+Long-running HTTP service for the orchestrator agent.
+
+Loads the encoder, connects the vector store and builds the models once at start-up,
+then serves many conversations concurrently:
+
+    POST   /sessions                      -> {"session_id": "..."}
+    POST   /sessions/{session_id}/messages   {"message": "...", "stream": true|false}
+    DELETE /sessions/{session_id}
+    GET    /health, /stats, /metrics
+
+Each session keeps its own orchestrator agent (and therefore its conversation), and
+handles one message at a time. The first message of a session is a standalone question,
+so it can be answered from the semantic answer cache (see answer_cache.py). With
+"stream": true the answer is sent as server-sent events ("token" events with text
+deltas, then a "done" event). At most
+SERVER_MAX_CONCURRENT_REQUESTS messages are processed at once; further requests wait
+up to SERVER_QUEUE_TIMEOUT_SECONDS and are then rejected with 429.
+
+Run with: python -m src.server
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+import uvicorn
+from cachetools import TTLCache
+from sse_starlette.sse import EventSourceResponse
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from . import metrics
+from .answer_cache import answer_cache
+from .agents import letter_counter_agent, plotly_agent
+from .agents.plot_renderer import get_renderer
+from .main import build_orchestrator, get_orchestrator_model, prepare_prompt
+from .qdrant_db import cache, clients, stores
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_MAX_CONCURRENT_REQUESTS = int(os.getenv("SERVER_MAX_CONCURRENT_REQUESTS", "8"))
+SERVER_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SERVER_QUEUE_TIMEOUT_SECONDS", "5"))
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "1000"))
+SERVER_SESSION_TTL_SECONDS = float(os.getenv("SERVER_SESSION_TTL_SECONDS", "3600"))
+SERVER_MAX_MESSAGE_CHARS = int(os.getenv("SERVER_MAX_MESSAGE_CHARS", "8000"))
+
+
+class _Session:
+    """One conversation: its orchestrator agent and a lock so it runs one message at a time."""
+
+    def __init__(self):
+        self.agent = build_orchestrator(callback_handler=None)
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+        self.messages = 0
+
+
+# Sessions expire SERVER_SESSION_TTL_SECONDS after their last message (the entry is
+# re-set on every message, since TTLCache does not refresh on reads); beyond
+# SERVER_MAX_SESSIONS the least recently used one is dropped.
+_sessions = TTLCache(maxsize=SERVER_MAX_SESSIONS, ttl=SERVER_SESSION_TTL_SECONDS)
+_sessions_lock = threading.Lock()
+_request_slots = None  # asyncio.Semaphore, created on the server's event loop
+_turn_tasks = set()  # Streamed turns in progress (keeps references to their tasks)
+_stats = {"requests": 0, "rejected": 0, "in_flight": 0}
+
+
+def _error(status_code: int, message: str, **headers) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code, headers=headers or None)
+
+
+def _touch_session(session_id: str):
+    """Returns the session and restarts its expiry, or None if it is unknown or expired."""
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is not None:
+            _sessions[session_id] = session
+        return session
+
+
+async def _acquire_slot() -> bool:
+    """Waits for a free request slot, up to SERVER_QUEUE_TIMEOUT_SECONDS."""
+    try:
+        await asyncio.wait_for(_request_slots.acquire(), timeout=SERVER_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _stats["rejected"] += 1
+        metrics.count("server_rejected_requests")
+        return False
+    _stats["in_flight"] += 1
+    return True
+
+
+def _release_slot():
+    _stats["in_flight"] -= 1
+    _request_slots.release()
+
+
+def _start_turn(session: _Session):
+    # The orchestrator's usage metrics accumulate per agent; reset them so each turn is recorded on its own
+    session.agent.event_loop_metrics = type(session.agent.event_loop_metrics)()
+    session.messages += 1
+    _stats["requests"] += 1
+
+
+async def _cached_answer(session: _Session, message: str):
+    """Returns a cached answer for the first message of a session (recorded in its conversation), or None."""
+    if session.messages or not answer_cache.enabled:
+        return None
+    answer = await asyncio.to_thread(answer_cache.get, message)
+    if answer is None:
+        return None
+    async with session.lock:
+        session.agent.messages.extend([
+            {"role": "user", "content": [{"text": message}]},
+            {"role": "assistant", "content": [{"text": answer}]},
+        ])
+        session.messages += 1
+    _stats["requests"] += 1
+    return answer
+
+
+async def _single_event_stream(answer: str):
+    yield {"event": "token", "data": json.dumps({"text": answer})}
+    yield {"event": "done", "data": json.dumps({"cached": True})}
+
+
+async def create_session(request):
+    session_id = uuid.uuid4().hex
+    session = _Session()
+    with _sessions_lock:
+        _sessions[session_id] = session
+    return JSONResponse({"session_id": session_id}, status_code=201)
+
+
+async def delete_session(request):
+    with _sessions_lock:
+        session = _sessions.pop(request.path_params["session_id"], None)
+    if session is None:
+        return _error(404, "Unknown session.")
+    return JSONResponse({"deleted": True})
+
+
+async def post_message(request):
+    session = _touch_session(request.path_params["session_id"])
+    if session is None:
+        return _error(404, "Unknown or expired session.")
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "Body must be JSON.")
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return _error(400, "'message' must be a non-empty string.")
+    if len(message) > SERVER_MAX_MESSAGE_CHARS:
+        return _error(413, f"'message' is longer than {SERVER_MAX_MESSAGE_CHARS} characters.")
+    if session.lock.locked():
+        return _error(409, "This session is already answering a message.")
+
+    # Cached answers skip the request slots: they cost one encode and a small matrix product
+    answer = await _cached_answer(session, message)
+    if answer is not None:
+        if body.get("stream"):
+            return EventSourceResponse(_single_event_stream(answer))
+        return JSONResponse({"answer": answer, "cached": True})
+
+    if not await _acquire_slot():
+        return _error(429, "Server is busy, retry later.", **{"Retry-After": "1"})
+
+    if body.get("stream"):
+        # The turn runs as its own task, which owns the slot: it is released when the
+        # turn ends even if the client disconnects before (or while) reading the stream
+        events = asyncio.Queue()
+        task = asyncio.create_task(_stream_turn(session, message, events))
+        _turn_tasks.add(task)
+        task.add_done_callback(_turn_tasks.discard)
+        return EventSourceResponse(_stream_events(events))
+
+    try:
+        async with session.lock:
+            standalone = session.messages == 0
+            # Read before answering, so a write during the turn makes the answer stale
+            version = await asyncio.to_thread(answer_cache.version) if standalone else None
+            _start_turn(session)
+            with metrics.span("orchestrator", mode="request"):
+                prompt = await asyncio.to_thread(prepare_prompt, message)
+                result = await asyncio.to_thread(session.agent, prompt)
+            metrics.record_agent_usage("orchestrator", result)
+            if standalone:
+                await asyncio.to_thread(answer_cache.put, message, str(result), version)
+    except Exception as e:
+        print(f"Error answering message: {e}")
+        return _error(500, f"An error occurred: {e}")
+    finally:
+        _release_slot()
+    return JSONResponse({"answer": str(result)})
+
+
+async def _stream_turn(session: _Session, message: str, events: asyncio.Queue):
+    """
+    Answers a message on a worker thread and puts server-sent events with its text
+    deltas on `events`, then None. Releases its request slot when done.
+
+    The agent is called synchronously on a thread (not through `stream_async`, which
+    joins its worker thread when cancelled and would block the event loop if the client
+    disconnects); a callback handler forwards the deltas to the event loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    def forward_delta(**kwargs):
+        if "data" in kwargs:
+            event = {"event": "token", "data": json.dumps({"text": kwargs["data"]})}
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+    try:
+        async with session.lock:
+            standalone = session.messages == 0
+            version = await asyncio.to_thread(answer_cache.version) if standalone else None
+            _start_turn(session)
+            with metrics.span("orchestrator", mode="stream"):
+                prompt = await asyncio.to_thread(prepare_prompt, message)
+                callback_handler = session.agent.callback_handler
+                session.agent.callback_handler = forward_delta  # The session lock makes this turn the only user
+                try:
+                    result = await asyncio.to_thread(session.agent, prompt)
+                finally:
+                    session.agent.callback_handler = callback_handler
+            metrics.record_agent_usage("orchestrator", result)
+            if standalone:
+                await asyncio.to_thread(answer_cache.put, message, str(result), version)
+        events.put_nowait({"event": "done", "data": "{}"})
+    except Exception as e:
+        print(f"Error streaming answer: {e}")
+        events.put_nowait({"event": "error", "data": json.dumps({"error": str(e)})})
+    finally:
+        _release_slot()
+        events.put_nowait(None)
+
+
+async def _stream_events(events: asyncio.Queue):
+    """Yields the events of a streamed turn until it ends."""
+    while True:
+        event = await events.get()
+        if event is None:
+            return
+        yield event
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def stats(request):
+    with _sessions_lock:
+        sessions = len(_sessions)
+    return JSONResponse({
+        "server": {**_stats, "sessions": sessions, "max_concurrent_requests": SERVER_MAX_CONCURRENT_REQUESTS},
+        "retrieval_cache": cache.get_cache_stats(),
+        "agent_pools": [letter_counter_agent.letter_counter_pool.metrics(), plotly_agent.plot_agent_pool.metrics()],
+        "plot_code_cache": plotly_agent.plot_code_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+    })
+
+
+async def prometheus_metrics(request):
+    return PlainTextResponse(metrics.export_prometheus())
+
+
+def warm_up():
+    """Loads and connects everything a first request would otherwise wait for."""
+    start = time.perf_counter()
+    stores.get_vector_store()
+    clients.warm_up(qdrant=False)  # The vector store above already connected Qdrant if it is used
+    get_orchestrator_model()
+    get_renderer().warm_up()
+    letter_counter_agent.letter_counter_pool.warm_up()
+    plotly_agent.plot_agent_pool.warm_up()
+    print(f"Server warm-up finished in {time.perf_counter() - start:.1f}s.")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _request_slots
+    _request_slots = asyncio.Semaphore(SERVER_MAX_CONCURRENT_REQUESTS)
+    await asyncio.to_thread(warm_up)
+    yield
+    get_renderer().close()
+
+
+app = Starlette(
+    routes=[
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+        Route("/sessions/{session_id}/messages", post_message, methods=["POST"]),
+        Route("/health", health),
+        Route("/stats", stats),
+        Route("/metrics", prometheus_metrics),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
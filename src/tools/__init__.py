@@ -1 +1 @@
-from . import letter_counter
\ No newline at end of file
+from . import letter_counter, letter_router
\ No newline at end of file
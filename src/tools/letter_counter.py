@@ -1,9 +1,10 @@
 from strands import tool
+from .. import metrics
 
-@tool
-def letter_counter(word: str, letter: str) -> int:
+def count_letter(word: str, letter: str) -> int:
     """
-    Count occurrences of a specific letter in a word.
+    Count occurrences of a specific letter in a word, ignoring case.
+    Plain-function version of the letter_counter tool, for direct calls.
 
     Args:
         word (str): The input word to search in
@@ -18,4 +19,19 @@ def letter_counter(word: str, letter: str) -> int:
     if len(letter) != 1:
         raise ValueError("The 'letter' parameter must be a single character")
 
-    return word.lower().count(letter.lower())
\ No newline at end of file
+    return word.lower().count(letter.lower())
+
+@tool
+@metrics.traced_tool
+def letter_counter(word: str, letter: str) -> int:
+    """
+    Count occurrences of a specific letter in a word.
+
+    Args:
+        word (str): The input word to search in
+        letter (str): The specific letter to count
+
+    Returns:
+        int: The number of occurrences of the letter in the word
+    """
+    return count_letter(word, letter)
\ No newline at end of file
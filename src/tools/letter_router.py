@@ -0,0 +1,203 @@
+import json
+import re
+import threading
+from .letter_counter import count_letter
+
+# Deterministic router for letter-count questions. Common phrasings (English, Portuguese,
+# Spanish) and structured batches are answered locally; anything it cannot parse with
+# certainty is left to the LLM agent.
+
+_QUOTES = "\"'`“”‘’«»"
+_QUOTED_CHAR = rf"[{_QUOTES}](?P<qletter>[^\W\d_])[{_QUOTES}]"
+_WORD = rf"(?:[{_QUOTES}](?P<qword>[^{_QUOTES}]+)[{_QUOTES}]|(?P<word>[^\s?.!,;:{_QUOTES}]+))"
+
+# "<lead> ... <preposition> <word>", e.g. "how many r's are in strawberry?",
+# "quantas letras 'a' em 'banana'", "cuántas veces aparece la letra a en banana"
+_QUESTION_PATTERN = re.compile(
+    r"^\s*(?:how\s+many|count|number\s+of|quant[ao]s|cont[ae]r?|conte|cu[aá]nt[ao]s|cuenta|contar)\b"
+    r"(?P<middle>[^?;\n]*?)"
+    r"\b(?:in|inside|within|em|no|na|en)\s+(?:the\s+word\s+|a\s+palavra\s+|la\s+palabra\s+|palavra\s+|palabra\s+)?"
+    + _WORD +
+    r"\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+
+# One "<letter> in <word>" pair of a list, e.g. "'a' in 'banana'"
+_PAIR_PATTERN = re.compile(
+    r"^\s*(?:the\s+letter\s+|a\s+letra\s+|la\s+letra\s+|letra\s+)?"
+    rf"(?:{_QUOTED_CHAR}|(?P<letter>[^\W\d_]))(?:'s)?"
+    r"\s+(?:in|em|no|na|en)\s+(?:the\s+word\s+|a\s+palavra\s+|la\s+palabra\s+)?"
+    + _WORD +
+    r"\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+_LEAD_PATTERN = re.compile(
+    r"^\s*(?:count|conte|contar|cuenta)(?:\s+(?:the\s+letters|as\s+letras|las\s+letras))?\s*:?\s*(?P<rest>.+)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+_EXPLICIT_LETTER_PATTERNS = [
+    re.compile(_QUOTED_CHAR),
+    re.compile(r"\b(?:letters?|letras?)\s+(?P<qletter>[^\W\d_])\b", re.IGNORECASE),
+    re.compile(r"\b(?P<qletter>[^\W\d_])'s\b", re.IGNORECASE),
+]
+# A preposition followed by a word inside the middle of a question means the lazy middle
+# group skipped past the real "in <word>" (e.g. "how many r's in strawberry in total?");
+# such questions are left to the LLM rather than answered for the wrong word.
+_MIDDLE_PREPOSITION = re.compile(r"\b(?:in|inside|within|em|no|na|en)\s+\S", re.IGNORECASE)
+# Filler words that may surround the letter in the middle of a question
+_FILLER_WORDS = {
+    "times", "does", "do", "the", "letter", "letters", "appear", "appears", "occur", "occurs",
+    "are", "there", "is", "of", "occurrences", "character", "characters",
+    "vezes", "letra", "letras", "aparece", "aparecem", "tem", "têm", "há", "existem", "ocorrências",
+    "veces", "la", "las", "hay", "aparecen",
+}
+_CLAUSE_SEPARATORS = re.compile(r"[;\n]+|\?\s+(?=\S)")
+_LIST_SEPARATORS = re.compile(r",|\s+(?:and|e|y)\s+", re.IGNORECASE)
+
+_stats_lock = threading.Lock()
+_stats = {"fast_path_queries": 0, "fast_path_pairs": 0, "llm_fallbacks": 0}
+
+
+def _match_word(match):
+    return match.group("qword") or match.group("word")
+
+
+def _letter_from_middle(middle: str):
+    """Finds the single letter named in the middle of a question, or None if unsure."""
+    for pattern in _EXPLICIT_LETTER_PATTERNS:
+        letters = {m.group("qletter").lower() for m in pattern.finditer(middle)}
+        if len(letters) == 1:
+            return letters.pop()
+        if letters:
+            return None
+    candidates = [token for token in re.findall(r"[^\W\d_]+", middle.lower()) if token not in _FILLER_WORDS]
+    if len(candidates) == 1 and len(candidates[0]) == 1:
+        return candidates[0]
+    return None
+
+
+def _parse_question(text: str):
+    match = _QUESTION_PATTERN.match(text)
+    if not match or _MIDDLE_PREPOSITION.search(match.group("middle")):
+        return None
+    letter = _letter_from_middle(match.group("middle"))
+    if letter is None:
+        return None
+    return _match_word(match), letter
+
+
+def _parse_pair(text: str):
+    match = _PAIR_PATTERN.match(text)
+    if not match:
+        return None
+    return _match_word(match), (match.group("qletter") or match.group("letter")).lower()
+
+
+def _parse_structured(query: str):
+    """Parses JSON batches: [["banana", "a"], ...] or [{"word": "banana", "letter": "a"}, ...]."""
+    try:
+        data = json.loads(query)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        return None
+    pairs = []
+    for item in data:
+        if isinstance(item, dict):
+            word, letter = item.get("word"), item.get("letter")
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            word, letter = item
+        else:
+            return None
+        if not isinstance(word, str) or not isinstance(letter, str) or len(letter) != 1:
+            return None
+        pairs.append((word, letter))
+    return pairs
+
+
+def parse_letter_queries(query: str):
+    """
+    Parses a letter-count request into (word, letter) pairs.
+
+    Accepts single questions ("how many r's in strawberry?", "quantas letras 'a' em 'banana'"),
+    several questions separated by newlines, semicolons or question marks, lists such as
+    "count 'a' in 'banana', 'r' in 'strawberry'", and JSON batches of pairs.
+
+    Args:
+        query (str): The request sent to count_letters.
+
+    Returns:
+        list[tuple[str, str]] | None: The pairs, or None if any part could not be parsed.
+
+    Questions with a second "in <word>" are not guessed at:
+
+    >>> parse_letter_queries("How many r's in strawberry?")
+    [('strawberry', 'r')]
+    >>> parse_letter_queries("How many r's in strawberry in total?") is None
+    True
+    >>> parse_letter_queries("How many e's in the word 'excellence' in English?") is None
+    True
+    >>> parse_letter_queries("How many r's in strawberry in Portuguese?") is None
+    True
+    """
+    if not isinstance(query, str) or not query.strip():
+        return None
+    stripped = query.strip()
+    if stripped[0] in "[{":
+        return _parse_structured(stripped)
+
+    pair = _parse_question(stripped)
+    if pair:
+        return [pair]
+
+    clauses = [clause for clause in _CLAUSE_SEPARATORS.split(stripped) if clause.strip()]
+    if len(clauses) > 1:
+        pairs = []
+        for clause in clauses:
+            pair = _parse_question(clause) or _parse_pair(clause)
+            if pair is None:
+                return None
+            pairs.append(pair)
+        return pairs
+
+    lead = _LEAD_PATTERN.match(stripped)
+    if lead:
+        pairs = []
+        for segment in _LIST_SEPARATORS.split(lead.group("rest")):
+            pair = _parse_pair(segment)
+            if pair is None:
+                return None
+            pairs.append(pair)
+        return pairs or None
+    return None
+
+
+def route_letter_query(query: str):
+    """
+    Answers a letter-count request locally when it can be parsed.
+
+    Returns:
+        str | None: The answer (a single number, or one "word / letter: count" line per
+                    pair for batches), or None when the request must go to the LLM.
+    """
+    pairs = parse_letter_queries(query)
+    if pairs is None:
+        with _stats_lock:
+            _stats["llm_fallbacks"] += 1
+        return None
+    counts = [(word, letter, count_letter(word, letter)) for word, letter in pairs]
+    with _stats_lock:
+        _stats["fast_path_queries"] += 1
+        _stats["fast_path_pairs"] += len(counts)
+    if len(counts) == 1:
+        return str(counts[0][2])
+    return "\n".join(f"{word} / {letter}: {count}" for word, letter, count in counts)
+
+
+def get_routing_stats() -> dict:
+    """Returns how many requests were answered locally and how many fell back to the LLM."""
+    with _stats_lock:
+        return dict(_stats)